@@ -4,7 +4,7 @@ import os
 
 import numpy as np
 
-from pyrl          import fittools, runtools, tasktools, utils
+from pyrl          import checkpoint, fittools, runtools, tasktools, utils
 from pyrl.figtools import apply_alpha, Figure
 
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -244,7 +244,7 @@ def sort(trialsfile, all_plots, units=None, network='p', **kwargs):
 
     """
     # Load trials
-    trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = utils.load(trialsfile)
+    trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = runtools.load(trialsfile)
 
     # Which network?
     if network == 'p':
@@ -520,7 +520,7 @@ def sort_statespace(trialsfile, all_plots, units=None, network='p', **kwargs):
 
     """
     # Load trials
-    trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = utils.load(trialsfile)
+    trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = runtools.load(trialsfile)
 
     # Which network?
     if network == 'p':
@@ -999,7 +999,7 @@ def statespace(trialsfile, plots=None, dt_reg=50, **kwargs):
 
     """
     # Load trials
-    trials_, U, Z, Z_b, A, P, M, perf, r_p, r_v = utils.load(trialsfile)
+    trials_, U, Z, Z_b, A, P, M, perf, r_p, r_v = runtools.load(trialsfile)
 
     # Use policy network for this analysis
     r = r_p
@@ -1344,7 +1344,7 @@ def psychometric(trialsfile, plots=None, **kwargs):
 
     """
     # Load trials
-    trials, A, R, M, perf = utils.load(trialsfile)
+    trials, A, R, M, perf = runtools.load(trialsfile)
 
     # Sort results by context, coherence
     results = {cond: {} for cond in ['mm', 'mc', 'cm', 'cc']}
@@ -1422,13 +1422,16 @@ def psychometric(trialsfile, plots=None, **kwargs):
 #/////////////////////////////////////////////////////////////////////////////////////////
 
 def performance(savefile, plot, **kwargs):
-    perf_history = utils.load(savefile)['perf_history']
+    training_history = checkpoint.load_history(savefile)
 
     all_trials    = []
     all_corrects  = []
     best_trials   = []
     best_corrects = []
-    for niters, ntrials, perf, is_best in perf_history:
+    for record in training_history:
+        ntrials = record['n_trials']
+        perf    = record['perf']
+        is_best = record['new_best']
         if is_best:
             if perf.n_decision > 0:
                 p_correct = perf.n_correct/perf.n_decision
@@ -19,7 +19,7 @@ colors = {
 
 def psychometric(trialsfile, plot, **kwargs):
     # Load trials
-    trials, A, R, M, perf = utils.load(trialsfile)
+    trials, A, R, M, perf = runtools.load(trialsfile)
 
     decision_by_freq = {}
     high_by_freq     = {}
@@ -119,7 +119,7 @@ def sort(trialsfile, plots, units=None, network='p', **kwargs):
 
     """
     # Load trials
-    data = utils.load(trialsfile)
+    data = runtools.load(trialsfile)
     trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = data
 
     # Which network?
@@ -13,7 +13,7 @@ from pyrl.figtools import Figure
 
 def choice_pattern(trialsfile, offers, plot, **kwargs):
     # Load trials
-    trials, A, R, M, perf = utils.load(trialsfile)
+    trials, A, R, M, perf = runtools.load(trialsfile)
 
     B_by_offer    = {}
     n_nondecision = 0
@@ -62,7 +62,7 @@ def choice_pattern(trialsfile, offers, plot, **kwargs):
 
 def indifference_point(trialsfile, offers, plot=None, **kwargs):
     # Load trials
-    trials, A, R, M, perf = utils.load(trialsfile)
+    trials, A, R, M, perf = runtools.load(trialsfile)
 
     B_by_offer    = {}
     n_nondecision = 0
@@ -258,7 +258,7 @@ def sort_epoch(behaviorfile, activityfile, epoch, offers, plots, units=None, net
 
     """
     # Load trials
-    data = utils.load(activityfile)
+    data = runtools.load(activityfile)
     trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = data
 
     if network == 'p':
@@ -33,7 +33,7 @@ def sure_stimulus_duration(trialsfile, plot, saved=None, **kwargs):
     if saved is not None:
         psure_by_duration_by_coh = saved
     else:
-        trials, A, R, M, perf = utils.load(trialsfile)
+        trials, A, R, M, perf = runtools.load(trialsfile)
 
         # Sort
         trials_by_cond = {}
@@ -90,7 +90,7 @@ def correct_stimulus_duration(trialsfile, plot, saved=None, **kwargs):
     if saved is not None:
         pcorrect_by_duration_by_coh, pcorrect_by_duration_by_coh_wager = saved
     else:
-        trials, A, R, M, perf = utils.load(trialsfile)
+        trials, A, R, M, perf = runtools.load(trialsfile)
 
         # Sort
         trials_by_cond       = {}
@@ -180,7 +180,7 @@ def value_stimulus_duration(trialsfile, plot, saved=None, **kwargs):
         value_by_duration_by_coh, value_by_duration_by_coh_wager = saved
     else:
         # Load trials
-        trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = utils.load(trialsfile)
+        trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = runtools.load(trialsfile)
 
         # Time
         time = trials[0]['time']
@@ -323,7 +323,7 @@ def get_preferred_targets(trials, perf, r):
 
 def sort(trialsfile, plots, unit=None, network='p', **kwargs):
     # Load trials
-    data = utils.load(trialsfile)
+    data = runtools.load(trialsfile)
     if len(data) == 9:
         trials, U, Z, A, P, M, perf, r_p, r_v = data
     else:
@@ -4,7 +4,7 @@ import os
 
 import numpy as np
 
-from pyrl          import datatools, fittools, runtools, tasktools, utils
+from pyrl          import checkpoint, datatools, fittools, runtools, tasktools, utils
 from pyrl.figtools import Figure
 
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -31,7 +31,7 @@ colors_kiani2009 = {
 
 def plot_trial(n, trialsfile, plots, unit=None, network='policy', **kwargs):
     # Load trials
-    trials, U, Z, A, rho, M, perf, r_policy, r_value = utils.load(trialsfile)
+    trials, U, Z, A, rho, M, perf, r_policy, r_value = runtools.load(trialsfile)
 
     trial = trials[n]
     U     = U[:,n]
@@ -190,7 +190,7 @@ def plot_trial(n, trialsfile, plots, unit=None, network='policy', **kwargs):
 
 def psychometric(trialsfile, m, plot, plot_decision=True, **kwargs):
     # Load trials
-    trials, A, R, M, perf = utils.load(trialsfile)
+    trials, A, R, M, perf = runtools.load(trialsfile)
 
     decision_by_coh = {}
     right_by_coh    = {}
@@ -266,7 +266,7 @@ def chronometric(trialsfile, plot, **kwargs):
 
     """
     # Load trials
-    trials, A, R, M, perf = utils.load(trialsfile)
+    trials, A, R, M, perf = runtools.load(trialsfile)
 
     # Time
     time = trials[0]['time']
@@ -374,7 +374,7 @@ def sort(trialsfile, plots, unit=None, network='p', **kwargs):
 
     """
     # Load trials
-    data = utils.load(trialsfile)
+    data = runtools.load(trialsfile)
     if len(data) == 9:
         trials, U, Z, A, P, M, perf, r_p, r_v = data
     else:
@@ -601,7 +601,7 @@ def sort_return(trialsfile, plots=None, **kwargs):
 
     """
     # Load trials
-    trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = utils.load(trialsfile)
+    trials, U, Z, Z_b, A, P, M, perf, r_p, r_v = runtools.load(trialsfile)
 
     # Same for every trial
     time  = trials[0]['time']
@@ -820,7 +820,7 @@ def sure_stimulus_duration(trialsfile, plot, saved=None, **kwargs):
     """
     if saved is None:
         # Load trials
-        trials, A, R, M, perf = utils.load(trialsfile)
+        trials, A, R, M, perf = runtools.load(trialsfile)
 
         sure_duration_by_coh = {}
         for n, trial in enumerate(trials):
@@ -887,7 +887,7 @@ def correct_stimulus_duration(trialsfile, plot, wager=False, saved=None, **kwarg
     """
     if saved is None:
         # Load trials
-        trials, A, R, M, perf = utils.load(trialsfile)
+        trials, A, R, M, perf = runtools.load(trialsfile)
 
         correct_duration_by_coh        = {}
         correct_duration_by_coh_waived = {}
@@ -1096,7 +1096,7 @@ def sort_postdecision(trialsfile, m, plots, unit=None, **kwargs):
 
     """
     # Load trials
-    trials, U, Z, A, R, M, perf, states, baseline_states = utils.load(trialsfile)
+    trials, U, Z, A, R, M, perf, states, baseline_states = runtools.load(trialsfile)
 
     # Data shape
     Ntime = states.shape[0]
@@ -1578,7 +1578,7 @@ def sort_postdecision(trialsfile, m, plots, unit=None, **kwargs):
 #/////////////////////////////////////////////////////////////////////////////////////////
 
 def training_history(savefile, plot, **kwargs):
-    training_history = utils.load(savefile)['training_history']
+    training_history = checkpoint.load_history(savefile)
 
     all_trials    = []
     all_corrects  = []
@@ -1702,7 +1702,7 @@ def do(action, args, config):
         else:
             network = 'policy'
 
-        trialsfile = os.path.join(config['trialspath'], 'trials_activity.pkl')
+        trialsfile = runtools.activityfile(config['trialspath'])
         plot_trial(n, trialsfile, (config['figspath'], 'trial{}_{}'.format(n, network)),
                    network=network)
 
@@ -1721,12 +1721,12 @@ def do(action, args, config):
         sort_return(trialsfile, os.path.join(config['figspath'], 'sorted_return'))
 
     elif action == 'sort-postdecision':
-        trialsfile = os.path.join(config['trialspath'], 'trials_activity.pkl')
+        trialsfile = runtools.activityfile(config['trialspath'])
         sort_postdecision(trialsfile, config['model'].spec,
                           (config['figspath'], 'sorted_postdecision'))
 
     elif action == 'sure-stimulus-duration':
-        trialsfile = os.path.join(config['trialspath'], 'trials_behavior.pkl')
+        trialsfile = runtools.behaviorfile(config['trialspath'])
 
         fig  = Figure()
         plot = fig.add()
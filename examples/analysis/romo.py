@@ -17,7 +17,7 @@ smap = mpl.cm.ScalarMappable(norm, cmap)
 
 def performance(trialsfile, plot, **kwargs):
     # Load trials
-    trials, A, R, M, perf = utils.load(trialsfile)
+    trials, A, R, M, perf = runtools.load(trialsfile)
 
     correct_by_cond = {}
     for n, trial in enumerate(trials):
@@ -65,7 +65,7 @@ def sort(trialsfile, plots, units=None, network='p', **kwargs):
 
     """
     # Load trials
-    data = utils.load(trialsfile)
+    data = runtools.load(trialsfile)
     if len(data) == 9:
         trials, U, Z, A, P, M, perf, r_p, r_v = data
     else:
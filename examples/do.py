@@ -6,7 +6,6 @@ Script for performing common tasks.
 import argparse
 import imp
 import os
-import shutil
 import sys
 import time
 
@@ -51,7 +50,7 @@ os.environ['THEANO_FLAGS'] += ',floatX=float32,allow_gc=False'
 if gpu:
     os.environ['THEANO_FLAGS'] += ',device=gpu,nvcc.fastmath=True'
 
-from pyrl       import utils
+from pyrl       import checkpoint, utils
 from pyrl.model import Model
 
 #=========================================================================================
@@ -80,8 +79,9 @@ figspath = os.path.join(workpath, 'figs', name)
 for path in [datapath, figspath, trialspath]:
     utils.mkdir_p(path)
 
-# File to store model in
-savefile = os.path.join(datapath, name + '.pkl')
+# Checkpoint to store the model in, or a legacy savefile that is converted when
+# training resumes from it
+savefile = checkpoint.find(datapath, name)
 
 #=========================================================================================
 # Info
@@ -91,11 +91,8 @@ if action == 'info':
     # Model specification
     model = Model(modelfile)
 
-    # Create a PolicyGradient instance
-    pg = model.get_pg(savefile, seed)
-
-    # Print additional info
-    config = pg.config
+    # Print the savefile summary, without building or compiling the networks
+    config = model.info(savefile)
     #print(config.keys())
     #print("Seed (policy):   {}".format(config['policy_seed']))
     #print("Seed (baseline): {}".format(config['baseline_seed']))
@@ -144,18 +141,8 @@ elif action == 'run':
         action = None
         args   = []
 
-    # Copy the savefile for safe access
-    if os.path.isfile(savefile):
-        base, ext = os.path.splitext(savefile)
-        savefile_copy = base + '_copy.pkl'
-        while True:
-            shutil.copy(savefile, savefile_copy)
-            try:
-                utils.load(savefile_copy)
-                break
-            except EOFError:
-                continue
-    else:
+    # Checkpoints are written atomically, so they can be read during training
+    if not checkpoint.exists(savefile):
         print("File {} doesn't exist.".format(savefile))
 
     # Pass everything on
@@ -163,7 +150,7 @@ elif action == 'run':
         'seed':       1,
         'suffix':     suffix,
         'model':      model,
-        'savefile':   savefile_copy,
+        'savefile':   savefile,
         'datapath':   datapath,
         'figspath':   figspath,
         'trialspath': trialspath
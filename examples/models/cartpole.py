@@ -61,6 +61,10 @@ class Performance(object):
     def update(self, trial, status):
         self.rewards.append(status['reward'])
 
+    def merge(self, other):
+        self.rewards += other.rewards
+        return self
+
     @property
     def n(self):
         return len(self.rewards)
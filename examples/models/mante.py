@@ -113,11 +113,11 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 not in epochs['decision']:
+    if not epochs.contains('decision', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             reward = R_ABORTED
-    elif t-1 in epochs['decision']:
+    elif epochs.contains('decision', t-1):
         if a == actions['CHOOSE-LEFT']:
             status['continue'] = False
             status['choice']   = 'L'
@@ -163,9 +163,9 @@ def get_step(rng, dt, trial, t, a):
         low_c  = inputs['COLOR-LEFT']
 
     u = np.zeros(len(inputs))
-    if t in epochs['fixation'] or t in epochs['stimulus'] or t in epochs['delay']:
+    if epochs.contains('fixation', t) or epochs.contains('stimulus', t) or epochs.contains('delay', t):
         u[context] = 1
-    if t in epochs['stimulus']:
+    if epochs.contains('stimulus', t):
         u[high_m] = scale(+trial['coh_m']) + rng.normal(scale=sigma)/np.sqrt(dt)
         u[low_m]  = scale(-trial['coh_m']) + rng.normal(scale=sigma)/np.sqrt(dt)
         u[high_c] = scale(+trial['coh_c']) + rng.normal(scale=sigma)/np.sqrt(dt)
@@ -175,6 +175,91 @@ def get_step(rng, dt, trial, t, a):
 
     return u, reward, status
 
+def get_rewards(rng, dt, trials, t, a):
+    """
+    Rewards and status for a batch of trials, i.e., `get_steps` without the inputs.
+
+    """
+    n_trials     = len(trials)
+    context      = tasktools.get_values(trials, 'context')
+    left_right_m = tasktools.get_values(trials, 'left_right_m')
+    left_right_c = tasktools.get_values(trials, 'left_right_c')
+
+    #-------------------------------------------------------------------------------------
+    # Reward
+    #-------------------------------------------------------------------------------------
+
+    status = tasktools.new_status(n_trials)
+    reward = np.zeros(n_trials)
+
+    decision = tasktools.in_epoch(trials, 'decision', t-1)
+
+    abort = ~decision & (a != actions['FIXATE'])
+    status['continue'][abort] = False
+    reward[abort] = R_ABORTED
+
+    left_right = np.where(context == 'm', left_right_m, left_right_c)
+    for action, choice, correct in [('CHOOSE-LEFT',  'L', left_right < 0),
+                                    ('CHOOSE-RIGHT', 'R', left_right > 0)]:
+        chosen = decision & (a == actions[action])
+        status['continue'][chosen] = False
+        status['choice'][chosen]   = choice
+        status['t_choice'][chosen] = t-1
+        status['correct'][chosen]  = correct[chosen]
+        reward[chosen & correct]   = R_CORRECT
+
+    #-------------------------------------------------------------------------------------
+
+    return reward, status
+
+def get_inputs(rng, dt, trials, t):
+    """
+    Inputs at the time indices `t` for a batch of trials, as a
+    (len(t), n_trials, Nin) array. The inputs don't depend on the actions, so the
+    inputs for whole trials can be generated at once.
+
+    """
+    context      = tasktools.get_values(trials, 'context')
+    left_right_m = tasktools.get_values(trials, 'left_right_m')
+    left_right_c = tasktools.get_values(trials, 'left_right_c')
+    coh_m        = tasktools.get_values(trials, 'coh_m')
+    coh_c        = tasktools.get_values(trials, 'coh_c')
+
+    context_input = np.where(context == 'm', inputs['MOTION'], inputs['COLOR'])
+
+    high_m = np.where(left_right_m < 0, inputs['MOTION-LEFT'],  inputs['MOTION-RIGHT'])
+    low_m  = np.where(left_right_m < 0, inputs['MOTION-RIGHT'], inputs['MOTION-LEFT'])
+    high_c = np.where(left_right_c < 0, inputs['COLOR-LEFT'],   inputs['COLOR-RIGHT'])
+    low_c  = np.where(left_right_c < 0, inputs['COLOR-RIGHT'],  inputs['COLOR-LEFT'])
+
+    fixation = tasktools.in_epoch(trials, 'fixation', t)
+    stimulus = tasktools.in_epoch(trials, 'stimulus', t)
+    delay    = tasktools.in_epoch(trials, 'delay',    t)
+
+    u = np.zeros(fixation.shape + (len(inputs),))
+
+    k, i = np.where(fixation | stimulus | delay)
+    u[k,i,context_input[i]] = 1
+
+    k, i  = np.where(stimulus)
+    noise = rng.normal(scale=sigma, size=(len(i), 4))/np.sqrt(dt)
+    u[k,i,high_m[i]] = scale(+coh_m[i]) + noise[:,0]
+    u[k,i,low_m[i]]  = scale(-coh_m[i]) + noise[:,1]
+    u[k,i,high_c[i]] = scale(+coh_c[i]) + noise[:,2]
+    u[k,i,low_c[i]]  = scale(-coh_c[i]) + noise[:,3]
+
+    return u
+
+def get_steps(rng, dt, trials, t, a):
+    """
+    Batch version of `get_step`.
+
+    """
+    reward, status = get_rewards(rng, dt, trials, t, a)
+    u = get_inputs(rng, dt, trials, [t])[0]
+
+    return u, reward, status
+
 def terminate(perf):
     p_decision, p_correct = tasktools.correct_2AFC(perf)
 
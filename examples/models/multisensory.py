@@ -109,11 +109,11 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 not in epochs['decision']:
+    if not epochs.contains('decision', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             reward = R_ABORTED
-    elif t-1 in epochs['decision']:
+    elif epochs.contains('decision', t-1):
         if a == actions['CHOOSE-LOW']:
             status['continue'] = False
             status['choice']   = 'L'
@@ -134,9 +134,9 @@ def get_step(rng, dt, trial, t, a):
     #-------------------------------------------------------------------------------------
 
     u = np.zeros(len(inputs))
-    if t in epochs['fixation'] or t in epochs['stimulus']:
+    if epochs.contains('fixation', t) or epochs.contains('stimulus', t):
         u[inputs['FIXATION']] = 1
-    if t in epochs['stimulus']:
+    if epochs.contains('stimulus', t):
         if 'v' in trial['mod']:
             u[inputs['VISUAL-P']] = (scale_p(trial['freq'])
                                      + rng.normal(scale=sigma)/np.sqrt(dt))
@@ -152,6 +152,74 @@ def get_step(rng, dt, trial, t, a):
 
     return u, reward, status
 
+def get_rewards(rng, dt, trials, t, a):
+    """
+    Rewards and status for a batch of trials, i.e., `get_steps` without the inputs.
+
+    """
+    n_trials = len(trials)
+    freq     = tasktools.get_values(trials, 'freq')
+
+    #-------------------------------------------------------------------------------------
+    # Reward
+    #-------------------------------------------------------------------------------------
+
+    status = tasktools.new_status(n_trials)
+    reward = np.zeros(n_trials)
+
+    decision = tasktools.in_epoch(trials, 'decision', t-1)
+
+    abort = ~decision & (a != actions['FIXATE'])
+    status['continue'][abort] = False
+    reward[abort] = R_ABORTED
+
+    for action, choice, correct in [('CHOOSE-LOW',  'L', freq < boundary),
+                                    ('CHOOSE-HIGH', 'H', freq > boundary)]:
+        chosen = decision & (a == actions[action])
+        status['continue'][chosen] = False
+        status['choice'][chosen]   = choice
+        status['t_choice'][chosen] = t-1
+        status['correct'][chosen]  = correct[chosen]
+        reward[chosen & correct]   = R_CORRECT
+
+    #-------------------------------------------------------------------------------------
+
+    return reward, status
+
+def get_inputs(rng, dt, trials, t):
+    """
+    Inputs at the time indices `t` for a batch of trials, as a
+    (len(t), n_trials, Nin) array. The inputs don't depend on the actions, so the
+    inputs for whole trials can be generated at once.
+
+    """
+    mod  = tasktools.get_values(trials, 'mod')
+    freq = tasktools.get_values(trials, 'freq')
+
+    fixation = tasktools.in_epoch(trials, 'fixation', t)
+    stimulus = tasktools.in_epoch(trials, 'stimulus', t)
+
+    u = np.zeros(fixation.shape + (len(inputs),))
+    u[fixation | stimulus, inputs['FIXATION']] = 1
+    for m, P, N in [('v', 'VISUAL-P', 'VISUAL-N'), ('a', 'AUDITORY-P', 'AUDITORY-N')]:
+        has_m = np.array([m in mod_ for mod_ in mod], dtype=bool)
+        k, i  = np.where(stimulus & has_m)
+        noise = rng.normal(scale=sigma, size=(len(i), 2))/np.sqrt(dt)
+        u[k,i,inputs[P]] = scale_p(freq[i]) + noise[:,0]
+        u[k,i,inputs[N]] = scale_n(freq[i]) + noise[:,1]
+
+    return u
+
+def get_steps(rng, dt, trials, t, a):
+    """
+    Batch version of `get_step`.
+
+    """
+    reward, status = get_rewards(rng, dt, trials, t, a)
+    u = get_inputs(rng, dt, trials, [t])[0]
+
+    return u, reward, status
+
 def terminate(perf):
     p_decision, p_correct = tasktools.correct_2AFC(perf)
 
@@ -107,11 +107,11 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 in epochs['fixation'] or t-1 in epochs['offer-on']:
+    if epochs.contains('fixation', t-1) or epochs.contains('offer-on', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             reward = R_ABORTED
-    elif t-1 in epochs['decision']:
+    elif epochs.contains('decision', t-1):
         if a in [actions['CHOOSE-LEFT'], actions['CHOOSE-RIGHT']]:
             status['continue'] = False
             status['t_choice'] = t-1
@@ -147,9 +147,9 @@ def get_step(rng, dt, trial, t, a):
     #-------------------------------------------------------------------------------------
 
     u = np.zeros(len(inputs))
-    if t not in epochs['decision']:
+    if not epochs.contains('decision', t):
         u[inputs['FIXATION']] = 1
-    if t in epochs['offer-on']:
+    if epochs.contains('offer-on', t):
         juiceL, juiceR = trial['juice']
         u[inputs['L-'+juiceL]] = 1
         u[inputs['R-'+juiceR]] = 1
@@ -161,6 +161,87 @@ def get_step(rng, dt, trial, t, a):
 
     return u, reward, status
 
+def get_rewards(rng, dt, trials, t, a):
+    """
+    Rewards and status for a batch of trials, i.e., `get_steps` without the inputs.
+
+    """
+    n_trials = len(trials)
+    juiceL   = np.array([trial['juice'][0] for trial in trials])
+    juiceR   = np.array([trial['juice'][1] for trial in trials])
+    nL       = tasktools.get_values(trials, 'nL')
+    nR       = tasktools.get_values(trials, 'nR')
+
+    #-------------------------------------------------------------------------------------
+    # Reward
+    #-------------------------------------------------------------------------------------
+
+    status = tasktools.new_status(n_trials)
+    reward = np.zeros(n_trials)
+
+    fixation = (tasktools.in_epoch(trials, 'fixation', t-1)
+                | tasktools.in_epoch(trials, 'offer-on', t-1))
+    decision = tasktools.in_epoch(trials, 'decision', t-1) & ~fixation
+
+    abort = fixation & (a != actions['FIXATE'])
+    status['continue'][abort] = False
+    reward[abort] = R_ABORTED
+
+    rL = nL * np.where(juiceL == 'A', R_A, R_B)
+    rR = nR * np.where(juiceR == 'A', R_A, R_B)
+    for action, juice, correct, r in [('CHOOSE-LEFT',  juiceL, rL >= rR, rL),
+                                      ('CHOOSE-RIGHT', juiceR, rR >= rL, rR)]:
+        chosen = decision & (a == actions[action])
+        status['continue'][chosen] = False
+        status['t_choice'][chosen] = t-1
+        status['choice'][chosen]   = juice[chosen]
+        status['correct'][chosen]  = correct[chosen]
+        reward[chosen] = r[chosen]
+
+    #-------------------------------------------------------------------------------------
+
+    return reward, status
+
+def get_inputs(rng, dt, trials, t):
+    """
+    Inputs at the time indices `t` for a batch of trials, as a
+    (len(t), n_trials, Nin) array. The inputs don't depend on the actions, so the
+    inputs for whole trials can be generated at once.
+
+    """
+    juiceL = [trial['juice'][0] for trial in trials]
+    juiceR = [trial['juice'][1] for trial in trials]
+    nL     = tasktools.get_values(trials, 'nL')
+    nR     = tasktools.get_values(trials, 'nR')
+
+    offer_L = np.array([inputs['L-'+juice] for juice in juiceL])
+    offer_R = np.array([inputs['R-'+juice] for juice in juiceR])
+
+    decision = tasktools.in_epoch(trials, 'decision', t)
+
+    u = np.zeros(decision.shape + (len(inputs),))
+    u[~decision, inputs['FIXATION']] = 1
+
+    k, i = np.where(tasktools.in_epoch(trials, 'offer-on', t))
+    u[k,i,offer_L[i]] = 1
+    u[k,i,offer_R[i]] = 1
+
+    noise = rng.normal(scale=sigma, size=(len(i), 2))/np.sqrt(dt)
+    u[k,i,inputs['N-L']] = scale(nL[i]) + noise[:,0]
+    u[k,i,inputs['N-R']] = scale(nR[i]) + noise[:,1]
+
+    return u
+
+def get_steps(rng, dt, trials, t, a):
+    """
+    Batch version of `get_step`.
+
+    """
+    reward, status = get_rewards(rng, dt, trials, t, a)
+    u = get_inputs(rng, dt, trials, [t])[0]
+
+    return u, reward, status
+
 def terminate(perf):
     p_decision, p_correct = tasktools.correct_2AFC(perf)
 
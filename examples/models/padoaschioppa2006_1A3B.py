@@ -107,11 +107,11 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 in epochs['fixation'] or t-1 in epochs['offer-on']:
+    if epochs.contains('fixation', t-1) or epochs.contains('offer-on', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             reward = R_ABORTED
-    elif t-1 in epochs['decision']:
+    elif epochs.contains('decision', t-1):
         if a in [actions['CHOOSE-LEFT'], actions['CHOOSE-RIGHT']]:
             status['continue'] = False
             status['t_choice'] = t-1
@@ -147,9 +147,9 @@ def get_step(rng, dt, trial, t, a):
     #-------------------------------------------------------------------------------------
 
     u = np.zeros(len(inputs))
-    if t not in epochs['decision']:
+    if not epochs.contains('decision', t):
         u[inputs['FIXATION']] = 1
-    if t in epochs['offer-on']:
+    if epochs.contains('offer-on', t):
         juiceL, juiceR = trial['juice']
         u[inputs['L-'+juiceL]] = 1
         u[inputs['R-'+juiceR]] = 1
@@ -137,11 +137,11 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 not in epochs['decision']:
+    if not epochs.contains('decision', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             reward = R_ABORTED
-    elif t-1 in epochs['decision']:
+    elif epochs.contains('decision', t-1):
         if a == actions['CHOOSE-LEFT']:
             status['continue'] = False
             status['choice']   = 'L'
@@ -177,18 +177,83 @@ def get_step(rng, dt, trial, t, a):
         low  = inputs['LEFT']
 
     u = np.zeros(len(inputs))
-    if t in epochs['fixation'] or t in epochs['stimulus'] or t in epochs['delay']:
+    if epochs.contains('fixation', t) or epochs.contains('stimulus', t) or epochs.contains('delay', t):
         u[inputs['FIXATION']] = 1
-    if t in epochs['stimulus']:
+    if epochs.contains('stimulus', t):
         u[high] = scale(+trial['coh']) + rng.normal(scale=sigma)/np.sqrt(dt)
         u[low]  = scale(-trial['coh']) + rng.normal(scale=sigma)/np.sqrt(dt)
-    if trial['wager'] and t in epochs['sure']:
+    if trial['wager'] and epochs.contains('sure', t):
         u[inputs['SURE']] = 1
 
     #-------------------------------------------------------------------------------------
 
     return u, reward, status
 
+def get_steps(rng, dt, trials, t, a):
+    """
+    Batch version of `get_step`.
+
+    """
+    n_trials   = len(trials)
+    wager      = tasktools.get_values(trials, 'wager').astype(bool)
+    left_right = tasktools.get_values(trials, 'left_right')
+    coh        = tasktools.get_values(trials, 'coh')
+
+    #-------------------------------------------------------------------------------------
+    # Reward
+    #-------------------------------------------------------------------------------------
+
+    status = tasktools.new_status(n_trials)
+    reward = np.zeros(n_trials)
+
+    decision = tasktools.in_epoch(trials, 'decision', t-1)
+
+    abort = ~decision & (a != actions['FIXATE'])
+    status['continue'][abort] = False
+    reward[abort] = R_ABORTED
+
+    for action, choice, correct in [('CHOOSE-LEFT',  'L', left_right < 0),
+                                    ('CHOOSE-RIGHT', 'R', left_right > 0)]:
+        chosen = decision & (a == actions[action])
+        status['continue'][chosen] = False
+        status['choice'][chosen]   = choice
+        status['t_choice'][chosen] = t-1
+        status['correct'][chosen]  = correct[chosen]
+        reward[chosen & correct]   = R_CORRECT
+
+    chosen = decision & (a == actions['CHOOSE-SURE'])
+    status['continue'][chosen] = False
+    status['choice'][chosen & wager]   = 'S'
+    status['t_choice'][chosen & wager] = t-1
+    reward[chosen & wager]  = R_SURE
+    reward[chosen & ~wager] = R_ABORTED
+
+    #-------------------------------------------------------------------------------------
+    # Inputs
+    #-------------------------------------------------------------------------------------
+
+    high = np.where(left_right < 0, inputs['LEFT'], inputs['RIGHT'])
+    low  = np.where(left_right < 0, inputs['RIGHT'], inputs['LEFT'])
+
+    fixation = tasktools.in_epoch(trials, 'fixation', t)
+    stimulus = tasktools.in_epoch(trials, 'stimulus', t)
+    delay    = tasktools.in_epoch(trials, 'delay',    t)
+    sure     = tasktools.in_epoch(trials, 'sure',     t)
+
+    u = np.zeros((n_trials, len(inputs)))
+    u[fixation | stimulus | delay, inputs['FIXATION']] = 1
+
+    i, = np.where(stimulus)
+    noise = rng.normal(scale=sigma, size=(len(i), 2))/np.sqrt(dt)
+    u[i,high[i]] = scale(+coh[i]) + noise[:,0]
+    u[i,low[i]]  = scale(-coh[i]) + noise[:,1]
+
+    u[wager & sure, inputs['SURE']] = 1
+
+    #-------------------------------------------------------------------------------------
+
+    return u, reward, status
+
 from pyrl.performance import PerformancePostdecisionWager as Performance
 
 def terminate(perf):
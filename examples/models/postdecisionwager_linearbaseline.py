@@ -140,11 +140,11 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 not in epochs['decision']:
+    if not epochs.contains('decision', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             reward = R_ABORTED
-    elif t-1 in epochs['decision']:
+    elif epochs.contains('decision', t-1):
         if a == actions['CHOOSE-LEFT']:
             status['continue'] = False
             status['choice']   = 'L'
@@ -180,12 +180,12 @@ def get_step(rng, dt, trial, t, a):
         low  = inputs['LEFT']
 
     u = np.zeros(len(inputs))
-    if t in epochs['fixation'] or t in epochs['stimulus'] or t in epochs['delay']:
+    if epochs.contains('fixation', t) or epochs.contains('stimulus', t) or epochs.contains('delay', t):
         u[inputs['FIXATION']] = 1
-    if t in epochs['stimulus']:
+    if epochs.contains('stimulus', t):
         u[high] = scale(+trial['coh']) + rng.normal(scale=sigma)/np.sqrt(dt)
         u[low]  = scale(-trial['coh']) + rng.normal(scale=sigma)/np.sqrt(dt)
-    if trial['wager'] and t in epochs['sure']:
+    if trial['wager'] and epochs.contains('sure', t):
         u[inputs['SURE']] = 1
 
     #-------------------------------------------------------------------------------------
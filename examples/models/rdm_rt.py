@@ -82,11 +82,11 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 in epochs['fixation']:
+    if epochs.contains('fixation', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             reward = R_ABORTED
-    elif t-1 in epochs['stimulus']:
+    elif epochs.contains('stimulus', t-1):
         if a == actions['CHOOSE-LEFT']:
             status['continue'] = False
             status['choice']   = 'L'
@@ -114,9 +114,9 @@ def get_step(rng, dt, trial, t, a):
         low  = inputs['LEFT']
 
     u = np.zeros(len(inputs))
-    if t in epochs['fixation']:
+    if epochs.contains('fixation', t):
         u[inputs['FIXATION']] = 1
-    if t in epochs['stimulus']:
+    if epochs.contains('stimulus', t):
         u[high] = scale(+trial['coh']) + rng.normal(scale=sigma)/np.sqrt(dt)
         u[low]  = scale(-trial['coh']) + rng.normal(scale=sigma)/np.sqrt(dt)
 
@@ -124,6 +124,60 @@ def get_step(rng, dt, trial, t, a):
 
     return u, reward, status
 
+def get_steps(rng, dt, trials, t, a):
+    """
+    Batch version of `get_step`.
+
+    """
+    n_trials   = len(trials)
+    left_right = tasktools.get_values(trials, 'left_right')
+    coh        = tasktools.get_values(trials, 'coh')
+
+    #-------------------------------------------------------------------------------------
+    # Reward
+    #-------------------------------------------------------------------------------------
+
+    status = tasktools.new_status(n_trials)
+    reward = np.zeros(n_trials)
+
+    fixation = tasktools.in_epoch(trials, 'fixation', t-1)
+    stimulus = tasktools.in_epoch(trials, 'stimulus', t-1) & ~fixation
+
+    abort = fixation & (a != actions['FIXATE'])
+    status['continue'][abort] = False
+    reward[abort] = R_ABORTED
+
+    for action, choice, correct in [('CHOOSE-LEFT',  'L', left_right < 0),
+                                    ('CHOOSE-RIGHT', 'R', left_right > 0)]:
+        chosen = stimulus & (a == actions[action])
+        status['continue'][chosen] = False
+        status['choice'][chosen]   = choice
+        status['t_choice'][chosen] = t-1
+        status['correct'][chosen]  = correct[chosen]
+        reward[chosen & correct]   = R_CORRECT
+
+    #-------------------------------------------------------------------------------------
+    # Inputs
+    #-------------------------------------------------------------------------------------
+
+    high = np.where(left_right < 0, inputs['LEFT'], inputs['RIGHT'])
+    low  = np.where(left_right < 0, inputs['RIGHT'], inputs['LEFT'])
+
+    fixation = tasktools.in_epoch(trials, 'fixation', t)
+    stimulus = tasktools.in_epoch(trials, 'stimulus', t)
+
+    u = np.zeros((n_trials, len(inputs)))
+    u[fixation, inputs['FIXATION']] = 1
+
+    i, = np.where(stimulus)
+    noise = rng.normal(scale=sigma, size=(len(i), 2))/np.sqrt(dt)
+    u[i,high[i]] = scale(+coh[i]) + noise[:,0]
+    u[i,low[i]]  = scale(-coh[i]) + noise[:,1]
+
+    #-------------------------------------------------------------------------------------
+
+    return u, reward, status
+
 def terminate(perf):
     p_decision, p_correct = tasktools.correct_2AFC(perf)
 
@@ -105,12 +105,12 @@ def get_step(rng, dt, trial, t, a):
     epochs = trial['epochs']
     status = {'continue': True}
     reward = 0
-    if t-1 not in epochs['decision']:
+    if not epochs.contains('decision', t-1):
         if a != actions['FIXATE']:
             status['continue'] = False
             status['choice']   = None
             reward = R_ABORTED
-    elif t-1 in epochs['decision']:
+    elif epochs.contains('decision', t-1):
         if a == actions['>']:
             status['continue'] = False
             status['choice']   = '>'
@@ -134,12 +134,12 @@ def get_step(rng, dt, trial, t, a):
         f2, f1 = trial['fpair']
 
     u = np.zeros(len(inputs))
-    if t not in epochs['decision']:
+    if not epochs.contains('decision', t):
         u[inputs['FIXATION']] = 1
-    if t in epochs['f1']:
+    if epochs.contains('f1', t):
         u[inputs['F-POS']] = scale_p(f1) + rng.normal(scale=sigma)/np.sqrt(dt)
         u[inputs['F-NEG']] = scale_n(f1) + rng.normal(scale=sigma)/np.sqrt(dt)
-    if t in epochs['f2']:
+    if epochs.contains('f2', t):
         u[inputs['F-POS']] = scale_p(f2) + rng.normal(scale=sigma)/np.sqrt(dt)
         u[inputs['F-NEG']] = scale_n(f2) + rng.normal(scale=sigma)/np.sqrt(dt)
 
@@ -147,6 +147,74 @@ def get_step(rng, dt, trial, t, a):
 
     return u, reward, status
 
+def get_rewards(rng, dt, trials, t, a):
+    """
+    Rewards and status for a batch of trials, i.e., `get_steps` without the inputs.
+
+    """
+    n_trials = len(trials)
+    gt_lt    = tasktools.get_values(trials, 'gt_lt')
+
+    #-------------------------------------------------------------------------------------
+    # Reward
+    #-------------------------------------------------------------------------------------
+
+    status = tasktools.new_status(n_trials, ['choice', 'correct'])
+    reward = np.zeros(n_trials)
+
+    decision = tasktools.in_epoch(trials, 'decision', t-1)
+
+    abort = ~decision & (a != actions['FIXATE'])
+    status['continue'][abort] = False
+    reward[abort] = R_ABORTED
+
+    for choice in ['>', '<']:
+        chosen  = decision & (a == actions[choice])
+        correct = (gt_lt == choice)
+        status['continue'][chosen] = False
+        status['choice'][chosen]   = choice
+        status['correct'][chosen]  = correct[chosen]
+        reward[chosen & correct]   = R_CORRECT
+
+    #-------------------------------------------------------------------------------------
+
+    return reward, status
+
+def get_inputs(rng, dt, trials, t):
+    """
+    Inputs at the time indices `t` for a batch of trials, as a
+    (len(t), n_trials, Nin) array. The inputs don't depend on the actions, so the
+    inputs for whole trials can be generated at once.
+
+    """
+    gt_lt = tasktools.get_values(trials, 'gt_lt')
+    fpair = tasktools.get_values(trials, 'fpair')
+
+    f1 = np.where(gt_lt == '>', fpair[:,0], fpair[:,1])
+    f2 = np.where(gt_lt == '>', fpair[:,1], fpair[:,0])
+
+    decision = tasktools.in_epoch(trials, 'decision', t)
+
+    u = np.zeros(decision.shape + (len(inputs),))
+    u[~decision, inputs['FIXATION']] = 1
+    for epoch, f in [('f1', f1), ('f2', f2)]:
+        k, i  = np.where(tasktools.in_epoch(trials, epoch, t))
+        noise = rng.normal(scale=sigma, size=(len(i), 2))/np.sqrt(dt)
+        u[k,i,inputs['F-POS']] = scale_p(f[i]) + noise[:,0]
+        u[k,i,inputs['F-NEG']] = scale_n(f[i]) + noise[:,1]
+
+    return u
+
+def get_steps(rng, dt, trials, t, a):
+    """
+    Batch version of `get_step`.
+
+    """
+    reward, status = get_rewards(rng, dt, trials, t, a)
+    u = get_inputs(rng, dt, trials, [t])[0]
+
+    return u, reward, status
+
 def terminate(perf):
     p_decision, p_correct = tasktools.correct_2AFC(perf)
 
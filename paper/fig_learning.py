@@ -6,7 +6,7 @@ import sys
 
 import numpy as np
 
-from pyrl          import utils
+from pyrl          import checkpoint, utils
 from pyrl.figtools import Figure
 
 #=========================================================================================
@@ -59,11 +59,11 @@ num_trials = []
 for name in additional + original:
     # Training history
     datapath = os.path.join(parent, 'examples', 'work', 'data', name)
-    savefile = os.path.join(datapath, name+'.pkl')
-    if not os.path.isfile(savefile):
+    savefile = checkpoint.find(datapath, name)
+    if not checkpoint.exists(savefile):
         continue
 
-    training_history = utils.load(savefile)['training_history']
+    training_history = checkpoint.load_history(savefile)
 
     # Time
     timefile = os.path.join(timespath, name+'.txt')
@@ -3,7 +3,7 @@ import os
 
 import numpy as np
 
-from pyrl          import utils
+from pyrl          import runtools, utils
 from pyrl.figtools import Figure
 
 #=========================================================================================
@@ -53,7 +53,7 @@ fig.add('trial-1', [x0, fig[-1].top+dy, w, h])
 
 #=========================================================================================
 
-trials, U, Z, A, rho, M, perf, r_policy, r_value = utils.load(rdm_fixed_activity)
+trials, U, Z, A, rho, M, perf, r_policy, r_value = runtools.load(rdm_fixed_activity)
 
 inputs = rdm_fixed_model.inputs
 
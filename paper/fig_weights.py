@@ -4,7 +4,7 @@ import sys
 
 import numpy as np
 
-from pyrl          import matrixtools, utils
+from pyrl          import checkpoint, matrixtools, utils
 from pyrl.figtools import Figure
 
 #=========================================================================================
@@ -44,8 +44,8 @@ fig.add('Wrec_gamma',  [fig[-1].right+DX, y0, w, h])
 #=========================================================================================
 
 datapath = os.path.join(parent, 'examples', 'work', 'data', modelname)
-savefile = os.path.join(datapath, modelname+'.pkl')
-save     = utils.load(savefile)
+savefile = checkpoint.find(datapath, modelname)
+save     = checkpoint.load(savefile)
 
 masks  = save['policy_masks']
 params = save['best_policy_params']
@@ -0,0 +1,324 @@
+"""
+Training checkpoints.
+
+A checkpoint is a directory that can be read while training writes it, without
+copying:
+
+  state.pkl    Index of the state: the scalar values, and the sections of the
+               current generation. Replaced atomically at every checkpoint.
+
+  state-<n>/   Sections of generation n, each written once. Arrays and dicts of
+               arrays are stored as .npy files, everything else is pickled.
+
+  history.log  Training history records (see `PolicyGradient.train`), appended one
+               at a time so that a checkpoint doesn't rewrite the whole history.
+
+The state records the size of the history it belongs to, so records appended after
+the last state was written are ignored and overwritten when training resumes.
+
+`load` memory-maps the array sections and unpickles the other sections only when
+they are accessed, so reading one field doesn't deserialize the whole state.
+
+Savefiles from before checkpoint directories are single pickles of the state with
+the history in it. They are read as they are, and converted to a checkpoint when
+training resumes from them.
+
+"""
+from __future__ import absolute_import
+
+import collections
+import cPickle as pickle
+import os
+import shutil
+import signal
+import struct
+
+import numpy as np
+
+from . import utils
+
+STATE   = 'state.pkl'
+HISTORY = 'history.log'
+
+# Length of each record in the history log
+HEADER = struct.Struct('<Q')
+
+def is_legacy(path):
+    return os.path.isfile(path)
+
+def exists(path):
+    return is_legacy(path) or os.path.isfile(os.path.join(path, STATE))
+
+def get_path(filename):
+    """
+    The checkpoint directory that the legacy savefile `filename` is converted to.
+
+    """
+    return os.path.splitext(filename)[0] + '.ckpt'
+
+def find(datapath, name):
+    """
+    The checkpoint directory of model `name` in `datapath`, or its legacy savefile
+    if that hasn't been converted.
+
+    """
+    filename = os.path.join(datapath, name + '.pkl')
+    if is_legacy(filename) and not exists(get_path(filename)):
+        return filename
+
+    return get_path(filename)
+
+def resolve(path):
+    """
+    The conversion of the legacy savefile `path` if there is one, otherwise `path`.
+
+    """
+    if is_legacy(path) and exists(get_path(path)):
+        return get_path(path)
+
+    return path
+
+def upgrade(path):
+    """
+    The checkpoint `path`, or the conversion of the legacy savefile `path`.
+
+    """
+    if not is_legacy(path):
+        return path
+
+    converted = get_path(path)
+    if not exists(converted):
+        convert(path, converted)
+
+    return converted
+
+def convert(filename, path):
+    print("[ checkpoint.convert ] Converting {} to {}".format(filename, path))
+
+    save    = utils.load(filename)
+    history = History(path)
+    for record in save.pop('training_history', []):
+        history.append(record)
+    history.close()
+    save['history_size'] = history.size
+
+    save_state(path, save)
+
+#=========================================================================================
+# Write
+#=========================================================================================
+
+def is_scalar(x):
+    return x is None or isinstance(x, (bool, int, long, float, str, np.generic))
+
+def is_arrays(x):
+    return (isinstance(x, dict)
+            and all([isinstance(v, np.ndarray) for v in x.values()]))
+
+def sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+def sync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def save_array(filename, x):
+    with open(filename, 'wb') as f:
+        np.save(f, x)
+        sync(f)
+
+def save_pickle(filename, x):
+    with open(filename, 'wb') as f:
+        pickle.dump(x, f, pickle.HIGHEST_PROTOCOL)
+        sync(f)
+
+def save_state(path, state):
+    """
+    Write the sections of `state` as a new generation, then replace the index
+    atomically so that readers see either the previous state or the new one. The
+    sections are synced to disk before the index, so after a crash the index doesn't
+    point to a generation that wasn't completely written. Older generations than the
+    previous one are removed. Keyboard interrupts are disabled while writing.
+
+    """
+    if is_legacy(path):
+        raise IOError("{} is a savefile, not a checkpoint directory.".format(path))
+    utils.mkdir_p(path)
+
+    filename = os.path.join(path, STATE)
+    if os.path.isfile(filename):
+        generation = utils.load(filename)['generation'] + 1
+    else:
+        generation = 0
+    gendir = os.path.join(path, 'state-{}'.format(generation))
+
+    s = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        # Left over from an interrupted write
+        if os.path.isdir(gendir):
+            shutil.rmtree(gendir)
+        os.mkdir(gendir)
+
+        index = {'generation': generation, 'values': {}, 'sections': {}}
+        for k, v in state.items():
+            if is_scalar(v):
+                index['values'][k] = v
+            elif isinstance(v, np.ndarray):
+                save_array(os.path.join(gendir, k + '.npy'), v)
+                index['sections'][k] = 'array'
+            elif is_arrays(v):
+                os.mkdir(os.path.join(gendir, k))
+                for name, x in v.items():
+                    save_array(os.path.join(gendir, k, name + '.npy'), x)
+                sync_dir(os.path.join(gendir, k))
+                index['sections'][k] = ('arrays', list(v.keys()))
+            else:
+                save_pickle(os.path.join(gendir, k + '.pkl'), v)
+                index['sections'][k] = 'pickle'
+        sync_dir(gendir)
+        sync_dir(path)
+
+        # Training is the only writer
+        tmpname = filename + '.tmp'
+        save_pickle(tmpname, index)
+        os.rename(tmpname, filename)
+        sync_dir(path)
+
+        # Readers that loaded the previous index may still be opening its sections
+        keep = ['state-{}'.format(generation), 'state-{}'.format(generation-1)]
+        for name in os.listdir(path):
+            if name.startswith('state-') and name not in keep:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    finally:
+        signal.signal(signal.SIGINT, s)
+
+class History(object):
+    def __init__(self, path, size=0):
+        """
+        Open the history log in `path` for appending, discarding anything after the
+        first `size` bytes.
+
+        """
+        if is_legacy(path):
+            raise IOError("{} is a savefile, not a checkpoint directory.".format(path))
+        utils.mkdir_p(path)
+
+        self.f = open(os.path.join(path, HISTORY), 'ab')
+        self.f.truncate(size)
+        self.size = size
+
+    def append(self, record):
+        """
+        Returns the size of the log including `record`, which is synced to disk before
+        the state that includes it is written.
+
+        """
+        data = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        self.f.write(HEADER.pack(len(data)) + data)
+        sync(self.f)
+        self.size += HEADER.size + len(data)
+
+        return self.size
+
+    def close(self):
+        self.f.close()
+
+#=========================================================================================
+# Read
+#=========================================================================================
+
+class Savefile(collections.Mapping):
+    """
+    Read-only view of a checkpoint with the same keys as a legacy savefile. Arrays
+    are memory-mapped copy-on-write, so changing them doesn't change the checkpoint.
+
+    """
+    def __init__(self, path):
+        self.path  = path
+        self.index = utils.load(os.path.join(path, STATE))
+        gendir     = os.path.join(path, 'state-{}'.format(self.index['generation']))
+
+        # Open every section now, so that they stay readable after training removes
+        # this generation
+        self.files  = {}
+        self.arrays = {}
+        for k, kind in self.index['sections'].items():
+            if kind == 'pickle':
+                self.files[k] = open(os.path.join(gendir, k + '.pkl'), 'rb')
+            elif kind == 'array':
+                self.arrays[k] = np.load(os.path.join(gendir, k + '.npy'), mmap_mode='c')
+            else:
+                _, names = kind
+                self.arrays[k] = collections.OrderedDict(
+                    [(name, np.load(os.path.join(gendir, k, name + '.npy'),
+                                    mmap_mode='c'))
+                     for name in names]
+                    )
+        self.loaded = {}
+
+    def __getitem__(self, k):
+        if k in self.index['values']:
+            return self.index['values'][k]
+        if k in self.arrays:
+            return self.arrays[k]
+        if k in self.files:
+            if k not in self.loaded:
+                self.loaded[k] = pickle.load(self.files[k])
+                self.files[k].close()
+            return self.loaded[k]
+        if k == 'training_history':
+            if k not in self.loaded:
+                self.loaded[k] = load_history(self.path, self['history_size'])
+            return self.loaded[k]
+        raise KeyError(k)
+
+    def __iter__(self):
+        for k in self.index['values']:
+            yield k
+        for k in self.index['sections']:
+            yield k
+        yield 'training_history'
+
+    def __len__(self):
+        return len(self.index['values']) + len(self.index['sections']) + 1
+
+def load(path):
+    """
+    Everything in a checkpoint, loaded as it's accessed, or in a legacy savefile.
+
+    """
+    path = resolve(path)
+    if is_legacy(path):
+        return utils.load(path)
+
+    return Savefile(path)
+
+def load_history(path, size=None):
+    """
+    Training history records. Only the first `size` bytes of the log are read if
+    given, and a record that is still being appended is left out.
+
+    """
+    path = resolve(path)
+    if is_legacy(path):
+        return utils.load(path)['training_history']
+
+    history = []
+    with open(os.path.join(path, HISTORY), 'rb') as f:
+        pos = 0
+        while size is None or pos + HEADER.size <= size:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            n, = HEADER.unpack(header)
+            data = f.read(n)
+            if len(data) < n:
+                break
+            history.append(pickle.loads(data))
+            pos += HEADER.size + n
+
+    return history
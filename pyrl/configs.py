@@ -14,6 +14,19 @@ default  = {
     'baseline_fix':          [],
     'target_reward':         np.inf,
     'mode':                  'episodic',
+    'rollout':               'serial',
+    'backend':               'theano',
+    'cache_functions':       True,
+    'workers':               1,
+    'hogwild_workers':       0,
+    'validation_workers':    1,
+    'background_validation': False,
+    'frozen_validation':     False,
+    'validation_seed':       0,
+    'pipeline':              False,
+    'staleness':             1,
+    'importance_weights':    False,
+    'max_importance_weight': 1,
     'network_type':          'gru',
     'baseline_network_type': 'gru',
     'R_ABORTED':             -1,
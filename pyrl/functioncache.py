@@ -0,0 +1,191 @@
+"""
+On-disk cache of compiled Theano functions.
+
+A compiled function is pickled with its shared variables replaced by labels. When it
+is loaded again, the labels are resolved to the shared variables of the current
+model, so the function works on the current parameters without being recompiled.
+
+"""
+from __future__ import absolute_import
+
+from   cStringIO import StringIO
+import cPickle as pickle
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import theano
+
+def get_cachedir():
+    return os.path.join(theano.config.compiledir, 'pyrl')
+
+def update_hash(h, obj):
+    """
+    Hash nested configs, including arrays, independently of dict order.
+
+    """
+    if isinstance(obj, dict):
+        h.update('{')
+        for k in sorted(obj):
+            update_hash(h, k)
+            update_hash(h, obj[k])
+        h.update('}')
+    elif isinstance(obj, (list, tuple)):
+        h.update('[')
+        for v in obj:
+            update_hash(h, v)
+        h.update(']')
+    elif isinstance(obj, np.ndarray):
+        h.update('{}{}'.format(obj.dtype, obj.shape))
+        h.update(np.ascontiguousarray(obj).tobytes())
+    else:
+        h.update(repr(obj))
+
+_source_hash = None
+
+def get_source_hash():
+    """
+    Hash of the pyrl source, so that cached functions are recompiled after changes
+    to the code that builds them.
+
+    """
+    global _source_hash
+
+    if _source_hash is None:
+        h    = hashlib.sha1()
+        path = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith('.py'):
+                h.update(filename)
+                with open(os.path.join(path, filename), 'rb') as f:
+                    h.update(f.read())
+        _source_hash = h.hexdigest()
+
+    return _source_hash
+
+class FunctionCache(object):
+    def __init__(self, key, cachedir=None):
+        """
+        key : dict
+              Everything that the compiled graphs depend on other than the values of
+              shared variables.
+
+        """
+        if cachedir is None:
+            cachedir = get_cachedir()
+        self.cachedir = cachedir
+
+        h = hashlib.sha1()
+        update_hash(h, key)
+        update_hash(h, {'theano':   theano.__version__,
+                        'floatX':   theano.config.floatX,
+                        'device':   theano.config.device,
+                        'source':   get_source_hash(),
+                        'python':   sys.version_info[:2]})
+        self.key = h.hexdigest()
+
+    def get_filename(self, name):
+        return os.path.join(self.cachedir, '{}-{}.pkl'.format(name, self.key))
+
+    def get(self, name, shared, compile_):
+        """
+        Returns the cached function `name` bound to the shared variables in `shared`
+        (label -> shared variable), or compiles it with `compile_()` and caches it.
+
+        """
+        filename = self.get_filename(name)
+
+        f = self.load(filename, shared)
+        if f is None:
+            f = compile_()
+            self.save(filename, f, shared)
+
+        return f
+
+    def load(self, filename, shared):
+        if not os.path.isfile(filename):
+            return None
+
+        def persistent_load(pid):
+            kind, label = pid
+            var = shared[label]
+            if kind == 'variable':
+                return var
+            if kind == 'container':
+                return var.container
+            if kind == 'storage':
+                return var.container.storage
+            return var.container.storage[0]
+
+        try:
+            with open(filename, 'rb') as fh:
+                # Labels and types of the shared variables used by the function
+                types = pickle.load(fh)
+                for label, type_ in types.items():
+                    if label not in shared or shared[label].type != type_:
+                        return None
+
+                unpickler = pickle.Unpickler(fh)
+                unpickler.persistent_load = persistent_load
+                with RecursionLimit():
+                    return unpickler.load()
+        except Exception as e:
+            print("[ FunctionCache ] Couldn't load {}: {}".format(filename, e))
+            return None
+
+    def save(self, filename, f, shared):
+        # Shared variables and their storage are stored as labels. The compiled code
+        # reads the values through the storage lists, which it shares with the
+        # containers of the shared variables.
+        pids = {}
+        for label, var in shared.items():
+            pids[id(var)]                      = ('variable',  label)
+            pids[id(var.container)]            = ('container', label)
+            pids[id(var.container.storage)]    = ('storage',   label)
+            pids[id(var.container.storage[0])] = ('value',     label)
+
+        types = {}
+        def persistent_id(obj):
+            pid = pids.get(id(obj))
+            if pid is not None:
+                types[pid[1]] = shared[pid[1]].type
+            return pid
+
+        # Write to a temporary file first so other jobs never see a partial file
+        tmpname = None
+        try:
+            buf     = StringIO()
+            pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+            pickler.persistent_id = persistent_id
+            with RecursionLimit():
+                pickler.dump(f)
+
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir)
+            fd, tmpname = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(types, fh, pickle.HIGHEST_PROTOCOL)
+                fh.write(buf.getvalue())
+            os.rename(tmpname, filename)
+        except Exception as e:
+            print("[ FunctionCache ] Couldn't save {}: {}".format(filename, e))
+            if tmpname is not None and os.path.exists(tmpname):
+                os.remove(tmpname)
+
+class RecursionLimit(object):
+    """
+    Pickling Theano graphs recurses deeply.
+
+    """
+    def __init__(self, limit=50000):
+        self.limit = limit
+
+    def __enter__(self):
+        self.old_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(self.limit, self.old_limit))
+
+    def __exit__(self, *args):
+        sys.setrecursionlimit(self.old_limit)
@@ -94,9 +94,11 @@ class GRU(Recurrent):
         if self.config['f_out'] == 'softmax':
             self.f_out     = theanotools.softmax
             self.f_log_out = theanotools.log_softmax
+            self.np_f_out  = nptools.softmax
         elif self.config['f_out'] == 'linear':
             self.f_out     = (lambda x: x)
             self.f_log_out = tensor.log
+            self.np_f_out  = (lambda x: x)
         else:
             raise ValueError(self.config['f_out'])
 
@@ -316,10 +318,29 @@ class GRU(Recurrent):
 
             return x_t
 
-        self.step         = step
-        self.step_params  = [self.alpha]
-        self.step_params += [self.get(k)
-                             for k in ['Win', 'bin', 'Wrec_gates', 'Wrec']]
+        self.step             = step
+        self.step_param_names = ['Win', 'bin', 'Wrec_gates', 'Wrec']
+        self.step_params      = [self.alpha]
+        self.step_params     += [self.get(k) for k in self.step_param_names]
+
+    def np_step(self, u, q, x_tm1, alpha, Win, bin, Wrec_gates, Wrec):
+        """
+        NumPy version of `step`.
+
+        """
+        inputs_t     = u.dot(Win) + bin
+        state_inputs = inputs_t[:,:self.N]
+        gate_inputs  = inputs_t[:,self.N:]
+
+        r_tm1 = self.firing_rate(x_tm1)
+
+        gate_values   = nptools.sigmoid(r_tm1.dot(Wrec_gates) + gate_inputs)
+        update_values = gate_values[:,:self.N]
+        g = gate_values[:,self.N:]
+        x_t = ((1 - alpha*update_values)*x_tm1
+               + alpha*update_values*((g*r_tm1).dot(Wrec) + state_inputs + q))
+
+        return x_t
 
     def get_regs(self, x0_, x, M):
         """
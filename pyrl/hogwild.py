@@ -0,0 +1,345 @@
+"""
+Asynchronous (Hogwild) training: worker processes share the parameters of both
+networks and their Adam accumulators through shared memory, and each applies its own
+updates without locks.
+
+"""
+from __future__ import absolute_import, division
+
+import ctypes
+from   collections import OrderedDict
+import datetime
+import multiprocessing
+import Queue
+import time
+import traceback
+
+import numpy as np
+
+from .           import nptools, utils
+from .checkpoint import History, save_state
+from .debug      import DEBUG
+from .parallel   import TrialRecord, ValidationPool
+
+class SharedArrays(object):
+    """
+    Copies of Theano shared variables in shared memory, inherited by forked processes.
+
+    """
+    def __init__(self, variables):
+        self.variables = variables
+
+        self.arrays = []
+        for v in variables:
+            x   = np.asarray(v.get_value())
+            raw = multiprocessing.RawArray(ctypes.c_char, max(x.nbytes, 1))
+            a   = np.frombuffer(raw, dtype=x.dtype, count=x.size).reshape(x.shape)
+            a[...] = x
+            self.arrays.append(a)
+
+        self.old = None
+
+    def pull(self):
+        """
+        Copy the shared values into the variables, keeping the values to compute the
+        changes made by an update.
+
+        """
+        self.old = [a.copy() for a in self.arrays]
+        for v, x in zip(self.variables, self.old):
+            v.set_value(x)
+
+    def push(self):
+        """
+        Add the changes made since `pull` to the shared values, without locking.
+
+        """
+        for v, a, old in zip(self.variables, self.arrays, self.old):
+            a += v.get_value(borrow=True) - old
+
+class HogwildTrainer(object):
+    def __init__(self, pg, n_workers):
+        self.pg        = pg
+        self.n_workers = n_workers
+
+    def get_variables(self):
+        pg = self.pg
+
+        variables = []
+        for net, sgd in [(pg.policy_net, pg.policy_sgd),
+                         (pg.baseline_net, pg.baseline_sgd)]:
+            variables += net.trainables + sgd.means + sgd.vars + [sgd.time]
+
+        return variables
+
+    def send_task_updates(self):
+        """
+        Send the task updates made since the last call to each worker, which has its
+        own copy of the task.
+
+        """
+        task_updates = self.pg.task_updates[self.n_task_updates:]
+        self.n_task_updates += len(task_updates)
+        for queue in self.task_queues:
+            for perf in task_updates:
+                queue.put(perf)
+
+    def run_worker(self, seed, task_queue, update_baseline, update_policy):
+        pg     = self.pg
+        pg.rng = nptools.get_rng(seed, __name__)
+
+        lr          = pg.config['lr']
+        baseline_lr = pg.config['baseline_lr']
+        n_gradient  = pg.config['n_gradient']
+
+        init   = None
+        init_b = None
+        try:
+            while not self.stop.value:
+                # Task updates made by the monitor
+                while True:
+                    try:
+                        perf = task_queue.get_nowait()
+                    except Queue.Empty:
+                        break
+                    pg.task.update(perf)
+
+                # Latest parameters
+                self.shared.pull()
+
+                # Trial conditions
+                if hasattr(pg.task, 'n_gradient'):
+                    n_gradient = pg.task.n_gradient
+                trials = [pg.task.get_condition(pg.rng, pg.dt)
+                          for i in xrange(n_gradient)]
+
+                # Run trials
+                (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b,
+                 record, r_policy, r_value) = pg.run_trials(
+                    trials, init=init, init_b=init_b, return_states=True,
+                    perf=TrialRecord(), run_baseline=False
+                    )
+
+                # Update
+                norm_b, norm = pg.update_networks(update_baseline, update_policy,
+                                                  U, Q, Q_b, A, R, M, r_policy,
+                                                  x0, x0_b, lr, baseline_lr)
+                self.shared.push()
+
+                self.results.put((n_gradient, record, norm_b, norm))
+        except KeyboardInterrupt:
+            pass
+        except Exception:
+            self.results.put(traceback.format_exc())
+
+    def train(self, savefile, recover=False):
+        """
+        Train with `n_workers` processes until `max_iter` updates have been made in
+        total. Every `checkfreq` updates the shared parameters are validated and saved
+        in the same format as `PolicyGradient.train`.
+
+        """
+        pg = self.pg
+
+        max_iter             = pg.config['max_iter']
+        n_validation         = pg.config['n_validation']
+        checkfreq            = pg.config['checkfreq']
+        n_validation_workers = pg.config.get('validation_workers', 1)
+        frozen_validation    = pg.config.get('frozen_validation', False)
+
+        #=================================================================================
+        # Setup
+        #=================================================================================
+
+        # Compiled before forking so that the workers share them
+        pg.compile_rollout_functions()
+        if recover:
+            print("Resume training.")
+            update_policy   = pg.func_update_policy(pg.mode == 'continuous',
+                                                    accumulators=pg.save['net_sgd'])
+            update_baseline = pg.func_update_baseline(pg.mode == 'continuous',
+                                                      accumulators=pg.save['baseline_sgd'])
+
+            iter_start = pg.save['iter']
+            perf       = pg.save['perf']
+            history    = History(savefile, pg.save['history_size'])
+            trials_tot = pg.save['trials_tot']
+
+            pg.rng.set_state(pg.save['rng_state'])
+        else:
+            update_policy   = pg.func_update_policy(pg.mode == 'continuous')
+            update_baseline = pg.func_update_baseline(pg.mode == 'continuous')
+
+            iter_start = 0
+            perf       = None
+            history    = History(savefile)
+            trials_tot = 0
+        best = pg.get_best(recover)
+
+        if hasattr(pg.task, 'start_session'):
+            pg.task.start_session(pg.rng)
+
+        # Shared between processes
+        self.shared  = SharedArrays(self.get_variables())
+        self.stop    = multiprocessing.RawValue(ctypes.c_bool, False)
+        self.results = multiprocessing.Queue()
+
+        # Task updates for the workers
+        self.task_queues    = [multiprocessing.Queue() for k in xrange(self.n_workers)]
+        self.n_task_updates = len(pg.task_updates)
+
+        # Validation trials split among worker processes
+        if n_validation_workers > 1:
+            validation_pool = ValidationPool(pg, n_validation_workers)
+        else:
+            validation_pool = None
+
+        seeds   = np.random.RandomState(pg.rng.randint(2**31)).randint(
+            2**31, size=self.n_workers
+            )
+        workers = [multiprocessing.Process(target=self.run_worker,
+                                           args=(seed, task_queue, update_baseline,
+                                                 update_policy))
+                   for seed, task_queue in zip(seeds, self.task_queues)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        print("[ HogwildTrainer.train ] {} workers.".format(self.n_workers))
+
+        #=================================================================================
+        # Monitor
+        #=================================================================================
+
+        iter_      = iter_start
+        next_check = iter_start
+        grad_norms_policy   = []
+        grad_norms_baseline = []
+
+        tstart           = datetime.datetime.now()
+        throughput_start = time.time()
+        throughput_iter  = iter_
+        throughput_tot   = trials_tot
+        try:
+            while True:
+                # Results from the workers
+                try:
+                    result = self.results.get(timeout=0.1)
+                except Queue.Empty:
+                    result = None
+                if isinstance(result, str):
+                    raise RuntimeError("Hogwild worker failed:\n" + result)
+                if result is not None:
+                    n_trials, trial_record, norm_b, norm = result
+                    if perf is None:
+                        perf = pg.Performance()
+                    trial_record.replay(perf)
+                    if np.isfinite(norm_b):
+                        grad_norms_baseline.append(norm_b)
+                    if np.isfinite(norm):
+                        grad_norms_policy.append(norm)
+
+                    iter_      += 1
+                    trials_tot += n_trials
+
+                if iter_ < next_check and iter_ < max_iter:
+                    continue
+
+                # Results that arrived during the last validation don't start another
+                next_check = (iter_//checkfreq + 1)*checkfreq
+
+                #-------------------------------------------------------------------------
+                # Checkpoint
+                #-------------------------------------------------------------------------
+
+                # Current parameters
+                self.shared.pull()
+
+                elapsed = utils.elapsed_time(tstart)
+                print("After {} updates ({})".format(iter_, elapsed))
+
+                rng_state = pg.rng.get_state()
+                if hasattr(pg.task, 'n_validation'):
+                    n_validation = pg.task.n_validation
+                if n_validation > 0:
+                    trials, crn, seed = pg.get_validation_trials(
+                        n_validation, frozen_validation, validation_pool
+                        )
+                    validation = ((iter_, trials_tot, n_validation,
+                                   pg.policy_net.get_values(),
+                                   pg.baseline_net.get_values(), rng_state)
+                                  + pg.validate(trials, crn, seed, validation_pool))
+
+                    # Continuous mode isn't supported, so there are no initial states
+                    items, terminate = pg.save_validation(
+                        savefile, history, best, validation,
+                        iter=iter_,
+                        init=None,
+                        init_b=None,
+                        perf=perf,
+                        trials_tot=trials_tot
+                        )
+                    self.send_task_updates()
+                else:
+                    items     = OrderedDict()
+                    terminate = False
+                    if hasattr(pg.task, 'terminate') and perf is not None:
+                        if pg.task.terminate(perf):
+                            terminate = True
+                    if perf is not None:
+                        items.update(perf.display(output=False))
+
+                    save_state(savefile, pg.get_save(iter=iter_,
+                                                     rng_state=rng_state,
+                                                     init=None,
+                                                     init_b=None,
+                                                     perf=perf,
+                                                     history_size=history.size,
+                                                     trials_tot=trials_tot,
+                                                     **best))
+
+                # Throughput
+                now = time.time()
+                if iter_ > throughput_iter:
+                    elapsed = now - throughput_start
+                    items['Trials/s']  = '{:.1f}'.format((trials_tot - throughput_tot)
+                                                         /elapsed)
+                    items['Updates/s'] = '{:.2f}'.format((iter_ - throughput_iter)
+                                                         /elapsed)
+                throughput_start = now
+                throughput_iter  = iter_
+                throughput_tot   = trials_tot
+
+                # Gradient norms
+                if len(grad_norms_policy) > 0:
+                    if DEBUG:
+                        items['|grad| (policy)']   = [len(grad_norms_policy)] + [
+                            f(grad_norms_policy) for f in [np.min, np.median, np.max]
+                            ]
+                        items['|grad| (baseline)'] = [len(grad_norms_baseline)] + [
+                            f(grad_norms_baseline) for f in [np.min, np.median, np.max]
+                            ]
+                    grad_norms_policy   = []
+                    grad_norms_baseline = []
+
+                utils.print_dict(items)
+
+                if best['best_reward'] >= pg.config['target_reward']:
+                    print("Target reward reached.")
+                    return
+                if terminate:
+                    print("Termination criterion satisfied.")
+                    return
+                if iter_ >= max_iter:
+                    print("Reached maximum number of iterations ({}).".format(iter_))
+                    return
+        except KeyboardInterrupt:
+            print("Training interrupted by user after {} updates.".format(iter_))
+        finally:
+            self.stop.value = True
+            for worker in workers:
+                worker.join(1)
+                if worker.is_alive():
+                    worker.terminate()
+            if validation_pool is not None:
+                validation_pool.close()
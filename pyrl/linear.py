@@ -96,9 +96,11 @@ class Linear(Recurrent):
         if self.config['f_out'] == 'softmax':
             self.f_out     = theanotools.softmax
             self.f_log_out = theanotools.log_softmax
+            self.np_f_out  = nptools.softmax
         elif self.config['f_out'] == 'linear':
             self.f_out     = (lambda x: x)
             self.f_log_out = tensor.log
+            self.np_f_out  = (lambda x: x)
         else:
             raise ValueError(self.config['f_out'])
 
@@ -308,10 +310,17 @@ class Linear(Recurrent):
         def step(u, q, x_tm1, alpha, Win, bin, Wrec_gates, Wrec):
             return u + 0*x_tm1 + 0*q
 
-        self.step         = step
-        self.step_params  = [self.alpha]
-        self.step_params += [self.get(k)
-                             for k in ['Win', 'bin', 'Wrec_gates', 'Wrec']]
+        self.step             = step
+        self.step_param_names = ['Win', 'bin', 'Wrec_gates', 'Wrec']
+        self.step_params      = [self.alpha]
+        self.step_params     += [self.get(k) for k in self.step_param_names]
+
+    def np_step(self, u, q, x_tm1, alpha, Win, bin, Wrec_gates, Wrec):
+        """
+        NumPy version of `step`.
+
+        """
+        return u + 0*x_tm1 + 0*q
 
     def get_regs(self, x0_, x, M):
         """
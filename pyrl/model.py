@@ -8,7 +8,7 @@ import imp
 import os
 import sys
 
-from .               import configs
+from .               import checkpoint, configs
 from .performance    import Performance2AFC
 from .policygradient import PolicyGradient
 
@@ -42,6 +42,10 @@ class Model(object):
                     setattr(_self, 'get_condition', self.spec.get_condition)
                     setattr(_self, 'get_step',      self.spec.get_step)
 
+                    for name in ['get_steps', 'get_rewards', 'get_inputs']:
+                        if name in vars(self.spec):
+                            setattr(_self, name, vars(self.spec)[name])
+
                     if 'terminate' in vars(self.spec):
                         setattr(_self, 'terminate', self.spec.terminate)
             self.Task = Task
@@ -92,17 +96,31 @@ class Model(object):
 
             self.config['checkfreq'] = 1
 
-    def get_pg(self, config_or_savefile, seed=1, dt=None, load='best'):
-        return PolicyGradient(self.Task, config_or_savefile, seed=seed, dt=dt, load=load)
+    def info(self, savefile):
+        """
+        Print a summary of the saved model without building the networks.
+
+        """
+        save = checkpoint.load(savefile)
+        PolicyGradient.print_summary(savefile, save)
+
+        return save['config']
+
+    def get_pg(self, config_or_savefile, seed=1, dt=None, load='best', backend=None):
+        return PolicyGradient(self.Task, config_or_savefile, seed=seed, dt=dt, load=load,
+                              backend=backend)
 
-    def train(self, savefile='savefile.pkl', seed=1, recover=False):
+    def train(self, savefile='savefile', seed=1, recover=False):
         """
         Train the network.
 
         """
-        if recover and os.path.isfile(savefile):
+        if recover and checkpoint.exists(savefile):
+            savefile = checkpoint.upgrade(savefile)
             pg = self.get_pg(savefile, load='current')
         else:
+            if checkpoint.is_legacy(savefile):
+                savefile = checkpoint.get_path(savefile)
             self.config['seed']          = 3*seed
             self.config['policy_seed']   = 3*seed + 1
             self.config['baseline_seed'] = 3*seed + 2
@@ -7,3 +7,15 @@ def get_rng(seed=0, loc='Not specified'):
 
 def relu(x):
     return np.maximum(0, x)
+
+def sigmoid(x):
+    return 1/(1 + np.exp(-np.clip(x, -30, 30)))
+
+def softmax(x):
+    """
+    Same as `theanotools.softmax`, i.e., without subtracting the maximum.
+
+    """
+    y = np.exp(x)
+
+    return y/y.sum(-1, keepdims=True)
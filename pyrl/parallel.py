@@ -0,0 +1,281 @@
+"""
+Gradient and validation trials run by forked worker processes, each with snapshots of
+the networks and its own random number generator.
+
+"""
+from __future__ import absolute_import, division
+
+import multiprocessing
+import traceback
+
+import numpy as np
+
+from . import nptools, returns
+
+class TrialRecord(object):
+    """
+    Stands in for a performance object in a worker, recording the updates so that
+    they can be replayed into the parent's performance object.
+
+    """
+    def __init__(self):
+        self.updates = []
+
+    def update(self, trial, status):
+        self.updates.append((trial, status))
+
+    def replay(self, perf):
+        for trial, status in self.updates:
+            perf.update(trial, status)
+
+        return perf
+
+class RolloutWorker(object):
+    """
+    Forked process that runs trials with snapshots of the networks. Requests name
+    one of the `run_*` methods, which run in the worker.
+
+    """
+    def __init__(self, pg, seed):
+        self.pg = pg
+
+        # Task updates the worker's copy of the task has had
+        self.n_task_updates = len(pg.task_updates)
+
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=self.run, args=(child_conn, seed))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+    def run(self, conn, seed):
+        self.pg.rng = nptools.get_rng(seed, __name__)
+
+        try:
+            while True:
+                msg = conn.recv()
+                if msg is None:
+                    break
+                method, args = msg
+                conn.send((True, getattr(self, method)(*args)))
+        except KeyboardInterrupt:
+            pass
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+        finally:
+            conn.close()
+
+    def get_task_updates(self):
+        """
+        Task updates made in the parent since the last request, to send with the next.
+
+        """
+        task_updates = self.pg.task_updates[self.n_task_updates:]
+        self.n_task_updates += len(task_updates)
+
+        return task_updates
+
+    def update_task(self, task_updates):
+        for perf in task_updates:
+            self.pg.task.update(perf)
+
+    def run_gradient(self, values, n_trials, task_updates):
+        """
+        Gradient trials with the worker's own random number generator.
+
+        """
+        pg = self.pg
+
+        # Task and policy as in the parent
+        self.update_task(task_updates)
+        pg.policy_net.set_values(values)
+
+        # Trial conditions
+        trials = [pg.task.get_condition(pg.rng, pg.dt) for i in xrange(n_trials)]
+
+        # Run trials
+        (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b,
+         record, r_policy, r_value) = pg.run_trials(
+            trials, return_states=True, perf=TrialRecord(), run_baseline=False
+            )
+
+        return U, Q, Q_b, Z, A, R, M, r_policy, record
+
+    def run_validation(self, values, values_b, task_updates, trials, seed, crn=False):
+        """
+        Validation trials with a random number generator seeded with `seed`, or with
+        `seed` as the common random numbers seed if `crn` is True. Returns the
+        performance and the sums needed for the mean reward and the prediction error
+        of the baseline.
+
+        """
+        pg = self.pg
+
+        # Task and network snapshots as in the parent
+        self.update_task(task_updates)
+        pg.policy_net.set_values(values)
+        pg.baseline_net.set_values(values_b)
+
+        if crn:
+            (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b,
+             perf, r_policy, r_value) = pg.run_trials(trials, return_states=True,
+                                                      run_baseline=False, crn=seed)
+        else:
+            rng    = pg.rng
+            pg.rng = np.random.RandomState(seed)
+            try:
+                (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b,
+                 perf, r_policy, r_value) = pg.run_trials(trials, return_states=True,
+                                                          run_baseline=False)
+            finally:
+                pg.rng = rng
+        Z_b = pg.get_baseline_outputs(r_policy, A, Q_b, M)
+        V   = returns.get_returns(R, M)
+
+        return (perf, np.sum(R*M, dtype=np.float64),
+                np.sum((Z_b - V)**2*M, dtype=np.float64), np.sum(M, dtype=np.float64))
+
+    def request(self, method, *args):
+        self.conn.send((method, args))
+
+    def ready(self):
+        return self.conn.poll()
+
+    def get(self):
+        ok, result = self.conn.recv()
+        if not ok:
+            raise RuntimeError("Rollout worker failed:\n" + result)
+
+        return result
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except IOError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+class RolloutWorkers(object):
+    def __init__(self, pg, n_workers, seed):
+        """
+        Worker k gets the k-th seed drawn from `seed`, so the trials are deterministic
+        for a given seed and number of workers.
+
+        pg : PolicyGradient
+             Forked after the step functions used for training have been compiled.
+
+        """
+        self.pg = pg
+
+        seeds = np.random.RandomState(seed).randint(2**31, size=n_workers)
+        self.workers = [RolloutWorker(pg, s) for s in seeds]
+        self.pending = []
+
+    def request(self, version, n_trials):
+        """
+        Split `n_trials` trials among the workers, run with the current policy.
+
+        """
+        values = self.pg.policy_net.get_values()
+
+        n_workers = len(self.workers)
+        sizes = [n_trials//n_workers + (k < n_trials % n_workers)
+                 for k in xrange(n_workers)]
+        for worker, size in zip(self.workers, sizes):
+            if size > 0:
+                worker.request('run_gradient', values, size,
+                               worker.get_task_updates())
+        self.pending.append((version, sizes))
+
+    def get(self):
+        """
+        Returns the version passed to the oldest request and its trials
+        (U, Q, Q_b, Z, A, R, M, r_policy, record), concatenated in worker order.
+
+        """
+        version, sizes = self.pending.pop(0)
+        batches = [worker.get() for worker, size in zip(self.workers, sizes)
+                   if size > 0]
+
+        arrays = [np.concatenate(x, axis=1) for x in zip(*[b[:-1] for b in batches])]
+        record = TrialRecord()
+        for b in batches:
+            record.updates += b[-1].updates
+
+        return version, arrays + [record]
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+class ValidationPool(object):
+    def __init__(self, pg, n_workers):
+        """
+        pg : PolicyGradient
+             Forked after the step functions used for training have been compiled.
+
+        """
+        self.pg      = pg
+        self.workers = [RolloutWorker(pg, k) for k in xrange(n_workers)]
+        self.active  = []
+
+    def run(self, trials, seed, crn=False):
+        """
+        Returns the merged performance, the total reward, and the prediction error
+        for `trials` run with the current networks.
+
+        """
+        self.submit(trials, seed, crn)
+
+        return self.result()
+
+    def submit(self, trials, seed, crn=False):
+        """
+        Start running `trials` with the current networks, split in order among the
+        workers. Worker k uses the k-th seed drawn from `seed`, so the results are
+        deterministic for a given seed and number of workers. If `crn` is True, the
+        seeds are used for common random numbers (see `PolicyGradient.run_trials`).
+
+        """
+        pg = self.pg
+
+        values   = pg.policy_net.get_values()
+        values_b = pg.baseline_net.get_values()
+
+        n_workers = len(self.workers)
+        seeds     = np.random.RandomState(seed).randint(2**31, size=n_workers)
+        bounds    = [len(trials)*k//n_workers for k in xrange(n_workers+1)]
+        for k, worker in enumerate(self.workers):
+            shard = trials[bounds[k]:bounds[k+1]]
+            if len(shard) > 0:
+                worker.request('run_validation', values, values_b,
+                               worker.get_task_updates(), shard, seeds[k], crn)
+                self.active.append(worker)
+
+    def ready(self):
+        return all([worker.ready() for worker in self.active])
+
+    def result(self):
+        """
+        Waits for the trials passed to `submit`, and returns the merged performance,
+        the total reward, and the prediction error.
+
+        """
+        results = [worker.get() for worker in self.active]
+        self.active = []
+
+        perf = results[0][0]
+        for result in results[1:]:
+            perf.merge(result[0])
+        reward_sum = sum([result[1] for result in results])
+        error_sum  = sum([result[2] for result in results])
+        mask_sum   = sum([result[3] for result in results])
+
+        return perf, reward_sum, np.sqrt(error_sum/mask_sum)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
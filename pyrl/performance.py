@@ -2,8 +2,13 @@ from __future__ import absolute_import, division
 
 from collections import OrderedDict
 
+import numpy as np
+
 from . import utils
 
+# Stored for a value that is None
+MISSING = -1
+
 class DefaultPerformance(object):
     def __init__(self):
         pass
@@ -11,47 +16,200 @@ class DefaultPerformance(object):
     def update(self, trial, status):
         pass
 
+    def merge(self, other):
+        return self
+
     def display(output=True):
         pass
 
-class Performance2AFC(object):
-    def __init__(self):
-        self.decisions = []
-        self.corrects  = []
-        self.choices   = []
-        self.t_choices = []
-        #self.rewards   = []
+class Column(object):
+    """
+    Read-only, list-like view of one per-trial value of a performance measure.
+
+    """
+    __slots__ = ('values', 'kind', 'labels')
+
+    def __init__(self, values, kind, labels=None):
+        """
+        kind : str
+               'bool', 'optional bool', 'optional int', or 'label' for indices into
+               `labels`. Optional values are None where MISSING.
+
+        """
+        self.values = values
+        self.kind   = kind
+        self.labels = labels
+
+    def decode(self, v):
+        if self.kind == 'bool':
+            return bool(v)
+        if v == MISSING:
+            return None
+        if self.kind == 'optional bool':
+            return bool(v)
+        if self.kind == 'label':
+            return self.labels[v]
+        return int(v)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.decode(v) for v in self.values[i]]
+        return self.decode(self.values[i])
+
+    def __iter__(self):
+        for v in self.values:
+            yield self.decode(v)
+
+    def __repr__(self):
+        return repr(list(self))
+
+class ArrayPerformance(object):
+    """
+    Performance measure that keeps the per-trial values in preallocated arrays, which
+    grow as needed, and keeps running counts so that summaries are O(1).
+
+    Subclasses define the arrays in `columns`, in the order of the arguments of their
+    `add` method, and the counts in `counters`. Choices are stored as indices into
+    `labels`.
+
+    """
+    __slots__ = ('n_trials', 'data', 'labels')
+
+    # (name, dtype)
+    columns  = []
+    counters = []
+
+    def __init__(self, capacity=64):
+        self.n_trials = 0
+        self.data     = OrderedDict([(name, np.empty(capacity, dtype=dtype))
+                                     for name, dtype in self.columns])
+        self.labels   = []
+        for name in self.counters:
+            setattr(self, name, 0)
+
+    def encode_label(self, label):
+        if label is None:
+            return MISSING
+        if label not in self.labels:
+            self.labels.append(label)
+
+        return self.labels.index(label)
+
+    def get(self, name):
+        return self.data[name][:self.n_trials]
+
+    def resize(self, capacity):
+        for name, x in self.data.items():
+            self.data[name] = np.empty(capacity, dtype=x.dtype)
+            self.data[name][:self.n_trials] = x[:self.n_trials]
+
+    def append(self, *values):
+        n = self.n_trials
+        if n == len(self.data[self.columns[0][0]]):
+            self.resize(max(2*n, 64))
+        for x, v in zip(self.data.values(), values):
+            x[n] = v
+        self.n_trials += 1
+
+    def merge(self, other):
+        """
+        Append the trials in `other`, e.g., from another process.
+
+        """
+        n = self.n_trials + other.n_trials
+        if n > len(self.data[self.columns[0][0]]):
+            self.resize(max(n, 64))
+        for name, x in self.data.items():
+            y = other.get(name)
+            if name == 'choices':
+                # MISSING (-1) picks the last entry
+                codes = [self.encode_label(label) for label in other.labels]
+                y = np.asarray(codes + [MISSING], dtype=x.dtype)[y]
+            x[self.n_trials:n] = y
+        self.n_trials = n
+
+        for name in self.counters:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+        return self
+
+    def __getstate__(self):
+        """
+        Compact form: the bytes of each array, with integers stored in the smallest
+        type that holds them.
+
+        """
+        data = OrderedDict()
+        for name in self.data:
+            x = self.get(name)
+            if x.dtype.kind == 'i' and len(x) > 0:
+                x = x.astype(np.promote_types(np.min_scalar_type(x.min()),
+                                              np.min_scalar_type(x.max())))
+            data[name] = (x.dtype.str, x.tobytes())
+
+        state = {'n_trials': self.n_trials, 'labels': self.labels, 'data': data}
+        for name in self.counters:
+            state[name] = getattr(self, name)
+
+        return state
+
+    def __setstate__(self, state):
+        # Pickled when the values were kept in lists
+        if 'data' not in state:
+            self.__init__()
+            for values in zip(*[state[name] for name, dtype in self.columns]):
+                self.add(*values)
+            return
+
+        self.n_trials = state['n_trials']
+        self.labels   = state['labels']
+        self.data     = OrderedDict()
+        for name, dtype in self.columns:
+            x = np.empty(max(self.n_trials, 64), dtype=dtype)
+            x[:self.n_trials] = np.frombuffer(state['data'][name][1],
+                                              dtype=state['data'][name][0])
+            self.data[name] = x
+        for name in self.counters:
+            setattr(self, name, state[name])
+
+class Performance2AFC(ArrayPerformance):
+    __slots__ = ('n_decision', 'n_correct')
+
+    columns  = [('decisions', np.bool_), ('corrects',  np.bool_),
+                ('choices',   np.int8),  ('t_choices', np.int32)]
+    counters = ['n_decision', 'n_correct']
 
     def update(self, trial, status):
-        #self.rewards.append(reward)
         if 'correct' in status:
-            self.decisions.append(True)
-            self.corrects.append(status['correct'])
-            if 'choice' in status:
-                self.choices.append(status['choice'])
-            else:
-                self.choices.append(None)
-            if 't_choice' in status:
-                self.t_choices.append(status['t_choice'])
-            else:
-                self.t_choices.append(None)
+            self.add(True, status['correct'], status.get('choice'),
+                     status.get('t_choice'))
         else:
-            self.decisions.append(False)
-            self.corrects.append(False)
-            self.choices.append(None)
-            self.t_choices.append(None)
+            self.add(False, False, None, None)
+
+    def add(self, decision, correct, choice, t_choice):
+        self.append(decision, correct, self.encode_label(choice),
+                    MISSING if t_choice is None else t_choice)
+        self.n_decision += bool(decision)
+        self.n_correct  += bool(correct)
+
+    @property
+    def decisions(self):
+        return Column(self.get('decisions'), 'bool')
 
     @property
-    def n_trials(self):
-        return len(self.decisions)
+    def corrects(self):
+        return Column(self.get('corrects'), 'bool')
 
     @property
-    def n_decision(self):
-        return sum(self.decisions)
+    def choices(self):
+        return Column(self.get('choices'), 'label', self.labels)
 
     @property
-    def n_correct(self):
-        return sum(self.corrects)
+    def t_choices(self):
+        return Column(self.get('t_choices'), 'optional int')
 
     def display(self, output=True):
         n_trials   = self.n_trials
@@ -69,46 +227,45 @@ class Performance2AFC(object):
             utils.print_dict(items)
         return items
 
-class PerformancePostdecisionWager(object):
-    def __init__(self):
-        self.wagers    = []
-        self.corrects  = []
-        self.choices   = []
-        self.t_choices = []
+class PerformancePostdecisionWager(ArrayPerformance):
+    __slots__ = ('n_wager', 'n_correct', 'n_answer', 'n_decision', 'n_sure',
+                 'n_sure_decision')
 
-    def update(self, trial, status):
-        self.wagers.append(trial['wager'])
-        self.corrects.append(status.get('correct'))
-        self.choices.append(status.get('choice'))
-        self.t_choices.append(status.get('t_choice'))
+    columns  = [('wagers',  np.bool_), ('corrects',  np.int8),
+                ('choices', np.int8),  ('t_choices', np.int32)]
+    counters = ['n_wager', 'n_correct', 'n_answer', 'n_decision', 'n_sure',
+                'n_sure_decision']
 
-    @property
-    def n_correct(self):
-        return sum([c for c in self.corrects if c is not None])
-
-    @property
-    def n_sure_decision(self):
-        return len([1 for w, c in zip(self.wagers, self.choices) if w and c is not None])
+    def update(self, trial, status):
+        self.add(trial['wager'], status.get('correct'), status.get('choice'),
+                 status.get('t_choice'))
 
-    @property
-    def n_trials(self):
-        return len(self.choices)
+    def add(self, wager, correct, choice, t_choice):
+        self.append(wager, MISSING if correct is None else correct,
+                    self.encode_label(choice), MISSING if t_choice is None else t_choice)
+        self.n_wager   += bool(wager)
+        self.n_correct += (correct is not None and bool(correct))
+        if choice is not None:
+            self.n_answer        += 1
+            self.n_decision      += choice in ['L', 'R']
+            self.n_sure          += choice == 'S'
+            self.n_sure_decision += bool(wager)
 
     @property
-    def n_decision(self):
-        return len([1 for c in self.choices if c in ['L', 'R']])
+    def wagers(self):
+        return Column(self.get('wagers'), 'bool')
 
     @property
-    def n_sure(self):
-        return len([1 for c in self.choices if c == 'S'])
+    def corrects(self):
+        return Column(self.get('corrects'), 'optional bool')
 
     @property
-    def n_answer(self):
-        return len([1 for c in self.choices if c is not None])
+    def choices(self):
+        return Column(self.get('choices'), 'label', self.labels)
 
     @property
-    def n_wager(self):
-        return sum(self.wagers)
+    def t_choices(self):
+        return Column(self.get('t_choices'), 'optional int')
 
     def display(self, output=True):
         n_trials        = self.n_trials
@@ -0,0 +1,66 @@
+"""
+Pipelined training: forked workers run the next batches of gradient trials with a
+snapshot of the policy while the parent updates the networks.
+
+"""
+from __future__ import absolute_import, division
+
+import numpy as np
+
+from .          import theanotools
+from .parallel  import RolloutWorkers
+
+class RolloutProducer(object):
+    def __init__(self, pg, staleness, seed, n_workers=1):
+        """
+        pg : PolicyGradient
+             Forked after the step functions used for training have been compiled.
+
+        staleness : int
+                    Number of batches requested ahead. A batch used for an update
+                    was run with the policy from at most `staleness` updates before.
+                    With 0, each batch is run with the current policy.
+
+        seed : int
+               Seed for the workers' random number generators.
+
+        n_workers : int
+                    Number of processes that each batch is split among.
+
+        """
+        self.staleness = staleness
+        self.workers   = RolloutWorkers(pg, n_workers, seed)
+
+    def get(self, version, n_gradient):
+        """
+        Returns the next batch and how many updates old the policy that ran it is.
+        If `staleness` > 0, a new batch is requested with the current policy before
+        returning, so that the workers keep running during the update.
+
+        version : int
+                  Number of updates made so far.
+
+        """
+        while len(self.workers.pending) < max(self.staleness, 1):
+            self.workers.request(version, n_gradient)
+
+        batch_version, batch = self.workers.get()
+
+        if self.staleness > 0:
+            self.workers.request(version, n_gradient)
+
+        return version - batch_version, batch
+
+    def close(self):
+        self.workers.close()
+
+def get_behavior_logp(Z, A, M):
+    """
+    Log-probabilities of the actions A under the policy that chose them, which are
+    the outputs Z of that policy, or 0 where M is 0.
+
+    """
+    p = np.sum(Z*A, axis=-1)
+    p[M == 0] = 1
+
+    return theanotools.asarray(np.log(p)*M)
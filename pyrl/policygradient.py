@@ -3,19 +3,60 @@ from __future__ import absolute_import, division
 from   collections import OrderedDict
 import datetime
 import sys
+import time
 
 import numpy as np
 
 import theano
 from   theano import tensor
 
-from .         import nptools, tasktools, theanotools, utils
-from .debug    import DEBUG
-from .networks import Networks
-from .sgd      import Adam
+from .              import checkpoint, nptools, returns, tasktools, theanotools, utils
+from .checkpoint    import History, save_state
+from .debug         import DEBUG
+from .functioncache import FunctionCache
+from .hogwild       import HogwildTrainer
+from .networks      import Networks
+from .parallel      import ValidationPool
+from .pipeline      import RolloutProducer, get_behavior_logp
+from .sgd           import Adam
+
+def step_function(name, build):
+    """
+    Property for a step function that is compiled the first time it's used, unless
+    it has already been set (e.g., to a NumPy step function).
+
+    """
+    def fget(self):
+        if name not in self.step_functions:
+            self.step_functions[name] = self.compile(name, lambda: build(self))
+        return self.step_functions[name]
+
+    def fset(self, f):
+        self.step_functions[name] = f
+
+    return property(fget, fset)
 
 class PolicyGradient(object):
-    def __init__(self, Task, config_or_savefile, seed, dt=None, load='best'):
+    # Compiled on first use
+    policy_step_0    = step_function('policy_step_0',
+                                     lambda self: self.policy_net.func_step_0())
+    policy_step_t    = step_function('policy_step_t',
+                                     lambda self: self.policy_net.func_step_t())
+    baseline_step_0  = step_function('baseline_step_0',
+                                     lambda self: self.baseline_net.func_step_0())
+    baseline_step_t  = step_function('baseline_step_t',
+                                     lambda self: self.baseline_net.func_step_t())
+    step_t_fused     = step_function('step_t_fused',
+                                     lambda self: self.func_step_t_fused())
+    step_t_policy    = step_function('step_t_policy',
+                                     lambda self: self.func_step_t_fused(baseline=False))
+    step_0_states    = step_function('policy_step_0_states',
+                                     lambda self: self.policy_net.func_step_0(True))
+    baseline_outputs = step_function('baseline_outputs',
+                                     lambda self: self.func_baseline_outputs())
+
+    def __init__(self, Task, config_or_savefile, seed, dt=None, load='best',
+                 backend=None):
         self.task = Task()
 
         #=================================================================================
@@ -28,22 +69,12 @@ class PolicyGradient(object):
             #-----------------------------------------------------------------------------
 
             savefile = config_or_savefile
-            save = utils.load(savefile)
+            save = checkpoint.load(savefile)
             self.save   = save
             self.config = save['config']
 
             # Model summary
-            print("[ PolicyGradient ]")
-            print("  Loading {}".format(savefile))
-            print("  Last saved after {} updates.".format(save['iter']))
-
-            # Performance
-            items = OrderedDict()
-            items['Best reward'] = '{} (after {} updates)'.format(save['best_reward'],
-                                                                  save['best_iter'])
-            if save['best_perf'] is not None:
-                items.update(save['best_perf'].display(output=False))
-            utils.print_dict(items)
+            self.print_summary(savefile, save)
 
             # Time step
             self.dt = dt
@@ -183,23 +214,27 @@ class PolicyGradient(object):
         self.scaled_baseline_var_rec = ((2*self.config['tau']/self.dt)
                                         * self.config['baseline_var_rec'])
 
+        # Compiled Theano functions or NumPy for running trials?
+        if backend is None:
+            backend = self.config.get('backend', 'theano')
+        if backend not in ['theano', 'numpy']:
+            raise ValueError(backend)
+        self.backend = backend
+
         # Run trials continuously?
         self.mode = self.config['mode']
-        if self.mode == 'continuous':
-            self.step_0_states = self.policy_net.func_step_0(True)
+
+        # Advance trials one at a time or together?
+        self.rollout = self.config.get('rollout', 'serial')
+        if self.rollout not in ['serial', 'batched']:
+            raise ValueError(self.rollout)
 
         # Maximum length of a trial
         self.Tmax = int(self.config['tmax']/self.config['dt']) + 1
 
         # Discount future reward
-        if np.isfinite(self.config['tau_reward']):
-            self.alpha_reward = self.dt/self.config['tau_reward']
-            def discount_factor(t):
-                return np.exp(-t*self.alpha_reward)
-        else:
-            def discount_factor(t):
-                return 1
-        self.discount_factor = discount_factor
+        self.discount = returns.discount_factors(self.Tmax, self.dt,
+                                                 self.config['tau_reward'])
 
         # Reward on aborted trials
         self.abort_on_last_t = self.config.get('abort_on_last_t', True)
@@ -212,23 +247,319 @@ class PolicyGradient(object):
         # Random number generator
         self.rng = nptools.get_rng(seed, __name__)
 
-        # Compile functions
-        self.policy_step_0   = self.policy_net.func_step_0()
-        self.policy_step_t   = self.policy_net.func_step_t()
-        self.baseline_step_0 = self.baseline_net.func_step_0()
-        self.baseline_step_t = self.baseline_net.func_step_t()
+        # Cache of compiled functions
+        if self.config.get('cache_functions', True):
+            self.function_cache = FunctionCache(self.get_function_key())
+        else:
+            self.function_cache = None
+
+        # Step functions, compiled on first use for the Theano backend
+        self.step_functions = {}
+        if self.backend == 'numpy':
+            self.set_np_step_functions()
+
+        # Built when first needed
+        self.frozen_validation_set = None
+
+        # Arguments of the calls to `task.update`, replayed by worker processes
+        self.task_updates = []
 
         # Performance
         self.Performance = self.config['Performance']
 
-    def make_noise(self, size, var=0):
+    @staticmethod
+    def print_summary(savefile, save):
+        """
+        Summary of a saved model, which only needs the contents of the savefile.
+
+        """
+        print("[ PolicyGradient ]")
+        print("  Loading {}".format(savefile))
+        print("  Last saved after {} updates.".format(save['iter']))
+
+        # Performance
+        items = OrderedDict()
+        items['Best reward'] = '{} (after {} updates)'.format(save['best_reward'],
+                                                              save['best_iter'])
+        if save['best_perf'] is not None:
+            items.update(save['best_perf'].display(output=False))
+        utils.print_dict(items)
+
+    def get_function_key(self):
+        """
+        Settings that the compiled functions depend on, other than the parameter
+        values.
+
+        """
+        key = {'Tmax': self.Tmax, 'mode': self.mode}
+        for name, net in [('policy', self.policy_net), ('baseline', self.baseline_net)]:
+            key[name] = {
+                'type':   net.type,
+                'config': net.config,
+                'masks':  sorted(net.masks)
+                }
+
+        return key
+
+    def get_shared_variables(self):
+        """
+        Shared variables that compiled functions can use, by label.
+
+        """
+        shared = OrderedDict()
+        for name, net in [('policy', self.policy_net), ('baseline', self.baseline_net)]:
+            for k, v in net.params.items():
+                shared[name + '/' + k] = v
+            for k, v in net.masks.items():
+                shared[name + '/masks/' + k] = v
+
+            sgd = getattr(self, name + '_sgd', None)
+            if sgd is not None:
+                for i, v in enumerate(sgd.means):
+                    shared['{}_sgd/means/{}'.format(name, i)] = v
+                for i, v in enumerate(sgd.vars):
+                    shared['{}_sgd/vars/{}'.format(name, i)] = v
+                shared[name + '_sgd/time'] = sgd.time
+
+        return shared
+
+    def compile(self, name, build):
+        """
+        Load the compiled function `name` from the cache, or compile it with `build()`.
+
+        """
+        with theanotools.compile_lock:
+            if self.function_cache is None:
+                return build()
+            return self.function_cache.get(name, self.get_shared_variables(), build)
+
+    def compile_rollout_functions(self):
+        """
+        Compile the functions used to run trials during training, so that they don't
+        wait for the update functions being compiled in the background.
+
+        """
+        names = ['policy_step_0']
+        if self.mode == 'continuous':
+            names += ['baseline_step_0', 'step_t_fused', 'policy_step_t',
+                      'baseline_step_t']
+        else:
+            names += ['step_t_policy', 'baseline_outputs']
+
+        for name in names:
+            getattr(self, name)
+
+    def set_np_step_functions(self):
+        """
+        NumPy step functions work on a snapshot of the parameters, so they're rebuilt
+        whenever the parameters may have changed.
+
+        """
+        values_p = self.policy_net.get_np_values()
+        values_b = self.baseline_net.get_np_values()
+
+        self.policy_step_0   = self.policy_net.np_func_step_0(values=values_p)
+        self.policy_step_t   = self.policy_net.np_func_step_t(values=values_p)
+        self.baseline_step_0 = self.baseline_net.np_func_step_0(values=values_b)
+        self.baseline_step_t = self.baseline_net.np_func_step_t(values=values_b)
+        self.step_t_fused    = self.np_func_step_t_fused(values_p, values_b)
+        self.step_t_policy   = self.np_func_step_t_fused(values_p, baseline=False)
+
+    def func_step_t_fused(self, baseline=True):
+        """
+        Returns a Theano function that advances the policy and baseline networks by
+        one time step in a single call. If `baseline` is False, only the policy
+        network is advanced.
+
+        The outputs are borrowed, so they are only valid until the next call.
+
+        """
+        u_t     = tensor.matrix('u_t')
+        q_t     = tensor.matrix('q_t')
+        q_t_b   = tensor.matrix('q_t_b')
+        x_tm1   = tensor.matrix('x_tm1')
+        x_tm1_b = tensor.matrix('x_tm1_b')
+        a_tm1   = tensor.matrix('a_tm1')
+
+        # Policy
+        net = self.policy_net
+        x_t = net.step(u_t, q_t, x_tm1, *net.step_params)
+        r_t = net.f_hidden(x_t)
+        z_t = net.f_out(r_t.dot(net.get('Wout')) + net.get('bout'))
+
+        if not baseline:
+            outputs = [theano.Out(v, borrow=True) for v in [z_t, x_t, r_t]]
+            return theano.function([u_t, q_t, x_tm1], outputs)
+
+        # Baseline
+        net   = self.baseline_net
+        u_t_b = tensor.concatenate([r_t, a_tm1], axis=-1)
+        x_t_b = net.step(u_t_b, q_t_b, x_tm1_b, *net.step_params)
+        r_t_b = net.f_hidden(x_t_b)
+        z_t_b = net.f_out(r_t_b.dot(net.get('Wout')) + net.get('bout'))
+
+        args    = [u_t, q_t, q_t_b, x_tm1, x_tm1_b, a_tm1]
+        outputs = [theano.Out(v, borrow=True) for v in [z_t, x_t, r_t, z_t_b, x_t_b]]
+
+        return theano.function(args, outputs)
+
+    def np_func_step_t_fused(self, values_p=None, values_b=None, baseline=True):
+        """
+        NumPy equivalent of `func_step_t_fused`, for a snapshot of the parameters.
+
+        """
+        if values_p is None:
+            values_p = self.policy_net.get_np_values()
+
+        net         = self.policy_net
+        step_params = [net.alpha] + [values_p[k] for k in net.step_param_names]
+
+        if not baseline:
+            def step_t_policy(u_t, q_t, x_tm1):
+                x_t = net.np_step(u_t, q_t, x_tm1, *step_params)
+                r_t = net.firing_rate(x_t)
+                z_t = net.np_f_out(r_t.dot(values_p['Wout']) + values_p['bout'])
+
+                return [z_t, x_t, r_t]
+
+            return step_t_policy
+
+        if values_b is None:
+            values_b = self.baseline_net.get_np_values()
+
+        net_b         = self.baseline_net
+        step_params_b = [net_b.alpha] + [values_b[k] for k in net_b.step_param_names]
+
+        def step_t_fused(u_t, q_t, q_t_b, x_tm1, x_tm1_b, a_tm1):
+            # Policy
+            x_t = net.np_step(u_t, q_t, x_tm1, *step_params)
+            r_t = net.firing_rate(x_t)
+            z_t = net.np_f_out(r_t.dot(values_p['Wout']) + values_p['bout'])
+
+            # Baseline
+            u_t_b = np.concatenate((r_t, a_tm1), axis=-1)
+            x_t_b = net_b.np_step(u_t_b, q_t_b, x_tm1_b, *step_params_b)
+            r_t_b = net_b.firing_rate(x_t_b)
+            z_t_b = net_b.np_f_out(r_t_b.dot(values_b['Wout']) + values_b['bout'])
+
+            return [z_t, x_t, r_t, z_t_b, x_t_b]
+
+        return step_t_fused
+
+    def make_noise(self, size, var=0, rng=None):
+        if rng is None:
+            rng = self.rng
         if var > 0:
-            return theanotools.asarray(self.rng.normal(scale=np.sqrt(var), size=size))
+            return theanotools.asarray(rng.normal(scale=np.sqrt(var), size=size))
         return theanotools.zeros(size)
 
+    def get_random_streams(self, n_trials, crn=None):
+        """
+        Random number generators for the recurrent noise and the task, and uniforms for
+        selecting actions (None to draw them as needed).
+
+        With a common random numbers seed `crn`, these are the same every time, and the
+        uniforms are drawn up front for every trial and time step so that each trial
+        gets the same numbers however long the other trials last. Otherwise they all
+        come from `self.rng`.
+
+        """
+        if crn is None:
+            return self.rng, self.rng, None
+
+        seeds    = np.random.RandomState(crn).randint(2**31, size=3)
+        uniforms = np.random.RandomState(seeds[2]).rand(self.Tmax, n_trials)
+
+        return (np.random.RandomState(seeds[0]), np.random.RandomState(seeds[1]),
+                uniforms)
+
+    def get_frozen_validation_set(self, n_validation):
+        """
+        Conditions and common random numbers seed for a validation set that is the
+        same at every validation, so that successive validations are paired.
+
+        """
+        if (self.frozen_validation_set is None
+            or len(self.frozen_validation_set[0]) != n_validation):
+            rng    = np.random.RandomState(self.config.get('validation_seed', 0))
+            trials = [self.task.get_condition(rng, self.dt)
+                      for i in xrange(n_validation)]
+            self.frozen_validation_set = (trials, rng.randint(2**31))
+
+        return self.frozen_validation_set
+
+    def update_task(self, perf):
+        """
+        Let the task adapt to the validation performance `perf`. Worker processes have
+        their own copies of the task, so the update is kept for them to replay.
+
+        """
+        self.task.update(perf)
+        self.task_updates.append(perf)
+
+    def can_run_batched(self, init=None):
+        """
+        Whether trials can be advanced together in lockstep.
+
+        Continuous mode carries the state over from one trial to the next, and tasks
+        with `start_trial` keep per-trial state, so both are run one trial at a time.
+
+        """
+        return (self.rollout == 'batched'
+                and self.mode != 'continuous'
+                and init is None
+                and not hasattr(self.task, 'start_trial'))
+
+    def get_task_step(self, rng, trial, t, a, inputs=None):
+        """
+        Task step of a single trial. If the `inputs` for the whole trial were
+        generated with `get_inputs`, only the reward and status are computed.
+
+        """
+        if inputs is None:
+            return self.task.get_step(rng, self.dt, trial, t, a)
+
+        reward, status = self.task.get_rewards(rng, self.dt, [trial], t, np.array([a]))
+
+        return inputs[t-1], reward[0], tasktools.get_status(status, 0)
+
     def run_trials(self, trials, init=None, init_b=None,
                    return_states=False, perf=None, task=None, progress_bar=False,
-                   p_dropout=0):
+                   p_dropout=0, run_baseline=True, crn=None):
+        """
+        Run trials with the current policy.
+
+        If `run_baseline` is False, the baseline network is not stepped and `Z_b`
+        (and the baseline firing rates) are left empty, for callers that compute the
+        baseline outputs afterwards (see `get_baseline_outputs`). The baseline is
+        always run in continuous mode, where its state carries over between trials.
+
+        With a seed `crn`, the noise, action-selection uniforms and task random
+        numbers are common to all calls with the same seed (see
+        `get_random_streams`), and `self.rng` is only used to generate trials. Tasks
+        that define `get_inputs` and `get_rewards` have their inputs generated for
+        whole trials before the rollout, as in `run_trials_batched`; other tasks get a
+        random number generator for each trial. Either way a trial's inputs don't
+        depend on how long the other trials last.
+
+        Otherwise each step calls `get_step`, which draws from `self.rng` in turn
+        with action selection, so a seed gives the same trials as it always has.
+        Generating the inputs up front would change that order, so the batch task
+        functions are only used with `crn` or when trials are run in lockstep
+        (`'rollout': 'batched'`, see `run_trials_batched`).
+
+        """
+        if self.mode == 'continuous':
+            run_baseline = True
+
+        if self.can_run_batched(init):
+            return self.run_trials_batched(trials, return_states=return_states,
+                                           perf=perf, progress_bar=progress_bar,
+                                           run_baseline=run_baseline, crn=crn)
+
+        if self.backend == 'numpy':
+            self.set_np_step_functions()
+
         if isinstance(trials, list):
             n_trials = len(trials)
         else:
@@ -248,11 +579,30 @@ class PolicyGradient(object):
         M   = theanotools.zeros((self.Tmax, n_trials))
         Z_b = theanotools.zeros((self.Tmax, n_trials))
 
+        # Random numbers
+        rng_noise, rng_task, uniforms = self.get_random_streams(n_trials, crn)
+
         # Noise
         Q   = self.make_noise((self.Tmax, n_trials, self.policy_net.noise_dim),
-                               self.scaled_var_rec)
+                               self.scaled_var_rec, rng_noise)
         Q_b = self.make_noise((self.Tmax, n_trials, self.baseline_net.noise_dim),
-                               self.scaled_baseline_var_rec)
+                               self.scaled_baseline_var_rec, rng_noise)
+
+        # Task random numbers that are common to all calls. Without `crn` the task
+        # steps draw from `self.rng` in turn with action selection.
+        precompute_inputs = False
+        task_seeds        = None
+        if crn is not None:
+            precompute_inputs = (hasattr(self.task, 'get_inputs')
+                                 and hasattr(self.task, 'get_rewards')
+                                 and not hasattr(self.task, 'start_trial'))
+            if precompute_inputs:
+                while len(trials) < n_trials:
+                    trials.append(self.task.get_condition(self.rng, self.dt))
+                U[:] = self.task.get_inputs(rng_task, self.dt, trials,
+                                            np.arange(1, self.Tmax+1))
+            else:
+                task_seeds = rng_task.randint(2**31, size=n_trials)
 
         x_t   = theanotools.zeros((1, self.policy_net.N))
         x_t_b = theanotools.zeros((1, self.baseline_net.N))
@@ -267,7 +617,10 @@ class PolicyGradient(object):
         # Firing rates
         if return_states:
             r_policy = theanotools.zeros((self.Tmax, n_trials, self.policy_net.N))
-            r_value  = theanotools.zeros((self.Tmax, n_trials, self.baseline_net.N))
+            if run_baseline:
+                r_value = theanotools.zeros((self.Tmax, n_trials, self.baseline_net.N))
+            else:
+                r_value = None
 
         # Keep track of initial conditions
         if self.mode == 'continuous':
@@ -309,19 +662,29 @@ class PolicyGradient(object):
                 trial = self.task.get_condition(self.rng, self.dt)
                 trials.append(trial)
 
+            # Task random numbers for this trial
+            if task_seeds is not None:
+                rng_task = np.random.RandomState(task_seeds[n])
+            if precompute_inputs:
+                inputs = U[:,n]
+            else:
+                inputs = None
+
             #-----------------------------------------------------------------------------
             # Time t = 0
             #-----------------------------------------------------------------------------
 
             t = 0
             if init is None:
-                z_t,   x_t[0]   = self.policy_step_0()
-                z_t_b, x_t_b[0] = self.baseline_step_0()
+                z_t, x_t[0] = self.policy_step_0()
+                if run_baseline:
+                    z_t_b, x_t_b[0] = self.baseline_step_0()
             else:
                 z_t,   x_t[0]   = init
                 z_t_b, x_t_b[0] = init_b
-            Z[t,n]   = z_t
-            Z_b[t,n] = z_t_b
+            Z[t,n] = z_t
+            if run_baseline:
+                Z_b[t,n] = z_t_b
 
             # Save initial condition
             if x0 is not None:
@@ -331,18 +694,22 @@ class PolicyGradient(object):
             # Save states
             if return_states:
                 r_policy[t,n] = self.policy_net.firing_rate(x_t[0])
-                r_value[t,n]  = self.baseline_net.firing_rate(x_t_b[0])
+                if run_baseline:
+                    r_value[t,n] = self.baseline_net.firing_rate(x_t_b[0])
 
             # Select action
-            a_t = theanotools.choice(self.rng, self.Nout, p=np.reshape(z_t, (self.Nout,)))
+            if uniforms is None:
+                a_t = theanotools.choice_batch(self.rng, z_t)[0]
+            else:
+                a_t = theanotools.choice_batch(self.rng, z_t, uniforms[t,n:n+1])[0]
             A[t,n,a_t] = 1
 
             #a_t = self.rng.normal(np.reshape(z_t, (self.Nout,)), self.sigma)
             #A[t,n,0] = a_t
 
             # Trial step
-            U[t,n], R[t,n], status = self.task.get_step(self.rng, self.dt,
-                                                        trial, t+1, a_t)
+            U[t,n], R[t,n], status = self.get_task_step(rng_task, trial, t+1, a_t,
+                                                        inputs)
             u_t    = U[t,n]
             M[t,n] = 1
 
@@ -359,22 +726,27 @@ class PolicyGradient(object):
                 if not status['continue']:
                     break
 
-                # Policy
-                z_t, x_t[0] = self.policy_step_t(u_t[None,:], q_t[None,:], x_t)
-                Z[t,n] = z_t
+                # Policy and baseline
+                if run_baseline:
+                    (z_t, x_t[0], r_t,
+                     z_t_b, x_t_b[0]) = self.step_t_fused(u_t[None,:], q_t[None,:],
+                                                          q_t_b[None,:], x_t, x_t_b,
+                                                          A[t-1,n][None,:])
+                    Z_b[t,n] = z_t_b[0]
+                else:
+                    z_t, x_t[0], r_t = self.step_t_policy(u_t[None,:], q_t[None,:],
+                                                          x_t)
+                Z[t,n] = z_t[0]
 
-                # Baseline
-                r_t = self.policy_net.firing_rate(x_t[0])
-                u_t_b = np.concatenate((r_t, A[t-1,n]), axis=-1)
-                z_t_b, x_t_b[0] = self.baseline_step_t(u_t_b[None,:],
-                                                       q_t_b[None,:],
-                                                       x_t_b)
-                Z_b[t,n] = z_t_b
+                # Baseline input, needed to continue into the next trial
+                if self.mode == 'continuous':
+                    u_t_b = np.concatenate((r_t[0], A[t-1,n]), axis=-1)
 
                 # Firing rates
                 if return_states:
-                    r_policy[t,n] = self.policy_net.firing_rate(x_t[0])
-                    r_value[t,n]  = self.baseline_net.firing_rate(x_t_b[0])
+                    r_policy[t,n] = r_t[0]
+                    if run_baseline:
+                        r_value[t,n] = self.baseline_net.firing_rate(x_t_b[0])
 
                     #W = self.policy_net.get_values()['Wout']
                     #b = self.policy_net.get_values()['bout']
@@ -384,8 +756,11 @@ class PolicyGradient(object):
                     #print(np.exp(V))
 
                 # Select action
-                a_t = theanotools.choice(self.rng, self.Nout,
-                                         p=np.reshape(z_t, (self.Nout,)))
+                if uniforms is None:
+                    a_t = theanotools.choice_batch(self.rng, Z[t,n])[0]
+                else:
+                    a_t = theanotools.choice_batch(self.rng, Z[t,n],
+                                                   uniforms[t,n:n+1])[0]
                 A[t,n,a_t] = 1
 
                 #a_t = self.rng.normal(np.reshape(z_t, (self.Nout,)), self.sigma)
@@ -397,9 +772,9 @@ class PolicyGradient(object):
                     R[t,n] = self.R_TERMINAL
                     status = {'continue': False, 'reward': R[t,n]}
                 else:
-                    U[t,n], R[t,n], status = self.task.get_step(self.rng, self.dt,
-                                                                trial, t+1, a_t)
-                R[t,n] *= self.discount_factor(t)
+                    U[t,n], R[t,n], status = self.get_task_step(rng_task, trial,
+                                                                t+1, a_t, inputs)
+                R[t,n] *= self.discount[t]
 
                 u_t    = U[t,n]
                 M[t,n] = 1
@@ -420,6 +795,10 @@ class PolicyGradient(object):
         if progress_bar:
             print("100")
 
+        # Inputs after the trials have ended
+        if precompute_inputs:
+            U *= M[:,:,None]
+
         #---------------------------------------------------------------------------------
 
         rvals = [U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b, perf]
@@ -428,7 +807,280 @@ class PolicyGradient(object):
 
         return rvals
 
-    def func_update_policy(self, Tmax, use_x0=False, accumulators=None):
+    def run_trials_batched(self, trials, return_states=False, perf=None,
+                           progress_bar=False, run_baseline=True, crn=None):
+        """
+        Run trials in lockstep, advancing all unfinished trials together as a batch.
+
+        The outputs have the same layout and masking as `run_trials`, but random
+        numbers for action selection and task steps are drawn time step by time step
+        rather than trial by trial.
+
+        Tasks can define `get_steps(rng, dt, trials, t, actions)`, which returns
+        (n_trials, Nin) inputs, (n_trials,) rewards, and a status dict of arrays
+        (see `tasktools.new_status`). Otherwise `get_step` is called for each trial.
+
+        Tasks whose inputs don't depend on the actions can instead define
+        `get_inputs(rng, dt, trials, t)`, which returns the (len(t), n_trials, Nin)
+        inputs at the time indices `t`, and `get_rewards(rng, dt, trials, t, actions)`,
+        which returns the rewards and status. The inputs for whole trials are then
+        generated before the rollout and masked once the trials have ended.
+
+        """
+        if self.backend == 'numpy':
+            self.set_np_step_functions()
+
+        if isinstance(trials, list):
+            n_trials = len(trials)
+        else:
+            n_trials = trials
+            trials   = [self.task.get_condition(self.rng, self.dt)
+                        for i in xrange(n_trials)]
+
+        # Storage
+        U   = theanotools.zeros((self.Tmax, n_trials, self.Nin))
+        Z   = theanotools.zeros((self.Tmax, n_trials, self.Nout))
+        A   = theanotools.zeros((self.Tmax, n_trials, self.n_actions))
+        R   = theanotools.zeros((self.Tmax, n_trials))
+        M   = theanotools.zeros((self.Tmax, n_trials))
+        Z_b = theanotools.zeros((self.Tmax, n_trials))
+
+        # Random numbers
+        rng_noise, rng_task, uniforms = self.get_random_streams(n_trials, crn)
+
+        # Noise
+        Q   = self.make_noise((self.Tmax, n_trials, self.policy_net.noise_dim),
+                               self.scaled_var_rec, rng_noise)
+        Q_b = self.make_noise((self.Tmax, n_trials, self.baseline_net.noise_dim),
+                               self.scaled_baseline_var_rec, rng_noise)
+
+        # Firing rates
+        if return_states:
+            r_policy = theanotools.zeros((self.Tmax, n_trials, self.policy_net.N))
+            if run_baseline:
+                r_value = theanotools.zeros((self.Tmax, n_trials, self.baseline_net.N))
+            else:
+                r_value = None
+
+        # Performance
+        if perf is None:
+            perf = self.Performance()
+
+        # Setup progress bar
+        if progress_bar:
+            progress_inc  = max(int(self.Tmax/50), 1)
+            progress_half = 25*progress_inc
+            utils.println("[ PolicyGradient.run_trials ] ")
+
+        # Final status of each trial
+        statuses = [None]*n_trials
+
+        # Batch version of the task step, if the task defines one
+        get_steps   = getattr(self.task, 'get_steps',   None)
+        get_rewards = getattr(self.task, 'get_rewards', None)
+        get_inputs  = getattr(self.task, 'get_inputs',  None)
+
+        # Inputs for whole trials, if they don't depend on the actions
+        precompute_inputs = (get_rewards is not None and get_inputs is not None)
+        if precompute_inputs:
+            U[:] = get_inputs(rng_task, self.dt, trials, np.arange(1, self.Tmax+1))
+
+        # Trials that haven't ended yet
+        active = np.arange(n_trials)
+
+        # Buffers for gathering the unfinished trials
+        buf_u   = theanotools.zeros((n_trials, self.Nin))
+        buf_q   = theanotools.zeros((n_trials, self.policy_net.noise_dim))
+        buf_q_b = theanotools.zeros((n_trials, self.baseline_net.noise_dim))
+        buf_x   = theanotools.zeros((n_trials, self.policy_net.N))
+        buf_x_b = theanotools.zeros((n_trials, self.baseline_net.N))
+        buf_a   = theanotools.zeros((n_trials, self.n_actions))
+
+        #---------------------------------------------------------------------------------
+        # Time t = 0
+        #---------------------------------------------------------------------------------
+
+        z_0, x0 = self.policy_step_0()
+        x_t  = theanotools.asarray(np.tile(x0, (n_trials, 1)))
+        Z[0] = z_0
+        if return_states:
+            r_policy[0] = self.policy_net.firing_rate(x_t)
+
+        if run_baseline:
+            z_0_b, x0_b = self.baseline_step_0()
+            x_t_b  = theanotools.asarray(np.tile(x0_b, (n_trials, 1)))
+            Z_b[0] = z_0_b
+            if return_states:
+                r_value[0] = self.baseline_net.firing_rate(x_t_b)
+
+        #---------------------------------------------------------------------------------
+        # Time t >= 0
+        #---------------------------------------------------------------------------------
+
+        for t in xrange(self.Tmax):
+            if progress_bar and t % progress_inc == 0:
+                if t == 0:
+                    utils.println("0")
+                elif t == progress_half:
+                    utils.println("50")
+                else:
+                    utils.println("|")
+
+            if t > 0:
+                # Gather the unfinished trials
+                n_active = len(active)
+                u_t   = np.take(U[t-1], active, axis=0, out=buf_u[:n_active])
+                q_t   = np.take(Q[t-1], active, axis=0, out=buf_q[:n_active])
+                x_tm1 = np.take(x_t,    active, axis=0, out=buf_x[:n_active])
+
+                # Policy and baseline
+                if run_baseline:
+                    q_t_b   = np.take(Q_b[t-1], active, axis=0, out=buf_q_b[:n_active])
+                    x_tm1_b = np.take(x_t_b,    active, axis=0, out=buf_x_b[:n_active])
+                    a_tm1   = np.take(A[t-1],   active, axis=0, out=buf_a[:n_active])
+
+                    z_t, x_t[active], r_t, z_t_b, x_t_b[active] = self.step_t_fused(
+                        u_t, q_t, q_t_b, x_tm1, x_tm1_b, a_tm1
+                        )
+                    Z_b[t,active] = z_t_b[:,0]
+                else:
+                    z_t, x_t[active], r_t = self.step_t_policy(u_t, q_t, x_tm1)
+                Z[t,active] = z_t
+
+                # Firing rates
+                if return_states:
+                    r_policy[t,active] = r_t
+                    if run_baseline:
+                        r_value[t,active] = self.baseline_net.firing_rate(x_t_b[active])
+
+            # Select actions
+            if uniforms is None:
+                actions = theanotools.choice_batch(self.rng, Z[t,active])
+            else:
+                actions = theanotools.choice_batch(self.rng, Z[t,active],
+                                                   uniforms[t,active])
+            A[t,active,actions] = 1
+
+            # Trial step
+            if t > 0 and self.abort_on_last_t and t == self.Tmax-1:
+                U[t,active] = 0
+                r_t    = self.R_TERMINAL
+                status = {'continue': np.zeros(len(active), dtype=bool),
+                          'reward':   np.repeat(r_t, len(active)).astype(object)}
+            else:
+                trials_t = [trials[n] for n in active]
+                if precompute_inputs:
+                    r_t, status = get_rewards(rng_task, self.dt, trials_t, t+1,
+                                              actions)
+                else:
+                    if get_steps is not None:
+                        u_t, r_t, status = get_steps(rng_task, self.dt, trials_t,
+                                                     t+1, actions)
+                    else:
+                        u_t, r_t, status = tasktools.get_steps(self.task.get_step,
+                                                               rng_task, self.dt,
+                                                               trials_t, t+1,
+                                                               actions)
+                    U[t,active] = u_t
+            R[t,active] = r_t
+            if t > 0:
+                R[t,active] *= self.discount[t]
+            M[t,active] = 1
+
+            # Keep the status of trials that have ended
+            if t == self.Tmax-1:
+                ended = np.arange(len(active))
+            else:
+                ended, = np.where(~status['continue'])
+            for i in ended:
+                statuses[active[i]] = tasktools.get_status(status, i)
+
+            # Remove trials that have ended
+            active = active[status['continue']]
+            if len(active) == 0:
+                break
+        if progress_bar:
+            print("100")
+
+        # Inputs after the trials have ended
+        if precompute_inputs:
+            U *= M[:,:,None]
+
+        # Update performance
+        for trial, status in zip(trials, statuses):
+            perf.update(trial, status)
+
+        #---------------------------------------------------------------------------------
+
+        rvals = [U, Q, Q_b, Z, Z_b, A, R, M, None, None, None, None, perf]
+        if return_states:
+            rvals += [r_policy, r_value]
+
+        return rvals
+
+    def func_baseline_outputs(self):
+        """
+        Returns a Theano function that runs the baseline network on whole batches of
+        stored trajectories.
+
+        """
+        U   = tensor.tensor3('U')
+        Q   = tensor.tensor3('Q')
+        x0  = self.baseline_net.params['x0']
+        x0_ = tensor.alloc(x0, U.shape[1], x0.shape[0])
+
+        z_0   = self.baseline_net.get_outputs_0(x0_)
+        r, z  = self.baseline_net.get_outputs(U, Q, x0_)
+        z_all = tensor.concatenate([z_0.reshape((1, z_0.shape[0], z_0.shape[1])), z],
+                                   axis=0)
+
+        return theano.function([U, Q], z_all[:,:,0])
+
+    def get_baseline_outputs(self, r_policy, A, Q_b, M):
+        """
+        Baseline outputs `Z_b` for trials run with `run_baseline=False`, computed in
+        one scan with the same inputs as during the trials.
+
+        """
+        baseline_inputs = np.concatenate((r_policy[1:], A[:-1]), axis=-1)
+
+        return self.baseline_outputs(baseline_inputs, Q_b[:-1])*M
+
+    def func_update_policy(self, use_x0=False, accumulators=None,
+                           background=False, importance_weights=False):
+        """
+        Returns a Theano function that updates the policy network, or if `background`
+        is True, a `BackgroundCompile` whose `get()` returns the function.
+
+        The optimizer is created first so that its state can be bound to a cached
+        function.
+
+        """
+        self.policy_sgd = Adam(self.policy_net.trainables, accumulators=accumulators)
+
+        name = 'update_policy'
+        if use_x0:
+            name += '_x0'
+        if importance_weights:
+            name += '_iw'
+
+        def build():
+            return self.compile(name, lambda: self.build_update_policy(
+                use_x0, importance_weights
+                ))
+
+        if background:
+            return theanotools.BackgroundCompile(build)
+        return build()
+
+    def build_update_policy(self, use_x0=False, importance_weights=False):
+        """
+        With `importance_weights`, the function also takes the log-probabilities
+        `logmu` of the actions under the policy that ran the trials and a maximum
+        weight `w_max`. Each term of the policy gradient is then weighted by the
+        truncated importance weight min(pi/mu, w_max).
+
+        """
         U = tensor.tensor3('U') # Inputs
         Q = tensor.tensor3('Q') # Noise
 
@@ -452,6 +1104,18 @@ class PolicyGradient(object):
         logpi_0 = tensor.sum(log_z_0*A[0], axis=-1)*M[0]
         logpi_t = tensor.sum(log_z*A[1:],  axis=-1)*M[1:]
 
+        # Correction for trials run with an earlier policy
+        if importance_weights:
+            logmu = tensor.matrix('logmu')
+            w_max = tensor.scalar('w_max')
+
+            logpi = tensor.concatenate([logpi_0[None,:], logpi_t])
+            w     = tensor.minimum(tensor.exp(logpi - logmu), w_max)
+            w     = theano.gradient.disconnected_grad(w)
+
+            logpi_0 = w[0]*logpi_0
+            logpi_t = w[1:]*logpi_t
+
         # Entropy
         #entropy_0 = tensor.sum(tensor.exp(log_z_0)*log_z_0, axis=-1)*M[0]
         #entropy_t = tensor.sum(tensor.exp(log_z)*log_z, axis=-1)*M[1:]
@@ -463,16 +1127,12 @@ class PolicyGradient(object):
         #logpi_0 = tensor.sum(f(A[0] - z_0), axis=-1)*M[0]
         #logpi_t = tensor.sum(f(A[1:] - z), axis=-1)*M[1:]
 
-        # Enforce causality
-        Mcausal = theanotools.zeros((Tmax-1, Tmax-1))
-        for i in xrange(Mcausal.shape[0]):
-            Mcausal[i,i:] = 1
-        Mcausal = theanotools.shared(Mcausal, 'Mcausal')
+        # Enforce causality: each action is credited with the rewards that follow it
+        G = tensor.extra_ops.cumsum((R[1:]*M[1:])[::-1], axis=0)[::-1]
 
         J0 = logpi_0*R[0]
         J0 = tensor.mean(J0)
-        J  = (logpi_t.T).dot(Mcausal).dot(R[1:]*M[1:])
-        J  = tensor.nlinalg.trace(J)/J.shape[0]
+        J  = tensor.sum(logpi_t*G)/logpi_t.shape[1]
 
         J += J0
 
@@ -488,7 +1148,6 @@ class PolicyGradient(object):
         obj = -J + self.policy_net.get_regs(x0_, r, M)# + 0.0005*entropy
 
         # SGD
-        self.policy_sgd = Adam(self.policy_net.trainables, accumulators=accumulators)
         if self.policy_net.type == 'simple':
             i = self.policy_net.index('Wrec')
             grads = tensor.grad(obj, self.policy_net.trainables)
@@ -502,10 +1161,31 @@ class PolicyGradient(object):
         else:
             args = []
         args += [U, Q, A, R, b, M, lr]
+        if importance_weights:
+            args += [logmu, w_max]
 
         return theano.function(args, norm, updates=updates)
 
-    def func_update_baseline(self, use_x0=False, accumulators=None):
+    def func_update_baseline(self, use_x0=False, accumulators=None, background=False):
+        """
+        Returns a Theano function that updates the baseline network, or if `background`
+        is True, a `BackgroundCompile` whose `get()` returns the function.
+
+        """
+        self.baseline_sgd = Adam(self.baseline_net.trainables, accumulators=accumulators)
+
+        name = 'update_baseline'
+        if use_x0:
+            name += '_x0'
+
+        def build():
+            return self.compile(name, lambda: self.build_update_baseline(use_x0))
+
+        if background:
+            return theanotools.BackgroundCompile(build)
+        return build()
+
+    def build_update_baseline(self, use_x0=False):
         U  = tensor.tensor3('U')
         R  = tensor.matrix('R')
         R_ = R.reshape((R.shape[0], R.shape[1], 1))
@@ -534,7 +1214,6 @@ class PolicyGradient(object):
         obj = L2 + self.baseline_net.get_regs(x0_, r, M)
 
         # SGD
-        self.baseline_sgd = Adam(self.baseline_net.trainables, accumulators=accumulators)
         if self.baseline_net.type == 'simple':
             i = self.baseline_net.index('Wrec')
             grads = tensor.grad(obj, self.baseline_net.trainables)
@@ -551,6 +1230,202 @@ class PolicyGradient(object):
 
         return theano.function(args, [z_all[:,:,0], norm, RMSE], updates=updates)
 
+    def update_networks(self, update_baseline, update_policy, U, Q, Q_b, A, R, M,
+                        r_policy, x0, x0_b, lr, baseline_lr, logmu=None, w_max=None):
+        """
+        Update the baseline and then the policy with a batch of trials, using the
+        functions returned by `func_update_baseline` and `func_update_policy`.
+
+        Returns the gradient norms for the baseline and the policy.
+
+        """
+        use_x0 = (self.mode == 'continuous')
+
+        #---------------------------------------------------------------------------------
+        # Update baseline
+        #---------------------------------------------------------------------------------
+
+        baseline_inputs = np.concatenate((r_policy, A), axis=-1)
+
+        # Compute return
+        R_b = returns.get_returns(R, M)
+
+        if use_x0:
+            args = [x0_b]
+        else:
+            args = []
+        args += [baseline_inputs[:-1], Q_b, R_b, M, baseline_lr]
+        b, norm_b, rmse = update_baseline(*args)
+
+        #---------------------------------------------------------------------------------
+        # Update policy
+        #---------------------------------------------------------------------------------
+
+        if use_x0:
+            args = [x0]
+        else:
+            args = []
+        args += [U[:-1], Q, A, R, b, M, lr]
+        if logmu is not None:
+            args += [logmu, w_max]
+        norm = update_policy(*args)
+
+        return float(norm_b), float(norm)
+
+    def get_save(self, **state):
+        """
+        Contents of a savefile: the model, its current parameters and optimizer state,
+        and the training state in `state`.
+
+        """
+        save = {
+            'config':                  self.config,
+            'policy_config':           self.policy_net.config,
+            'baseline_config':         self.baseline_net.config,
+            'policy_masks':            self.policy_net.get_masks(),
+            'baseline_masks':          self.baseline_net.get_masks(),
+            'current_policy_params':   self.policy_net.get_values(),
+            'current_baseline_params': self.baseline_net.get_values(),
+            'net_sgd':                 self.policy_sgd.get_values(),
+            'baseline_sgd':            self.baseline_sgd.get_values()
+            }
+        save.update(state)
+
+        return save
+
+    def get_best(self, recover=False):
+        """
+        Best results so far, under the keys they're saved with.
+
+        """
+        if recover:
+            return {k: self.save[k] for k in ['best_iter', 'best_reward', 'best_perf',
+                                              'best_policy_params',
+                                              'best_baseline_params']}
+
+        return {
+            'best_iter':            -1,
+            'best_reward':          -np.inf,
+            'best_perf':            None,
+            'best_policy_params':   self.policy_net.get_values(),
+            'best_baseline_params': self.baseline_net.get_values()
+            }
+
+    def get_validation_trials(self, n_validation, frozen=False, validation_pool=None):
+        """
+        Conditions of the validation trials, the common random numbers seed if the
+        validation set is `frozen` (otherwise None), and the seed for the workers of
+        `validation_pool`.
+
+        """
+        if frozen:
+            trials, crn = self.get_frozen_validation_set(n_validation)
+            seed = crn
+        else:
+            trials = [self.task.get_condition(self.rng, self.dt)
+                      for i in xrange(n_validation)]
+            crn  = None
+            seed = None
+        if validation_pool is not None and seed is None:
+            seed = self.rng.randint(2**31)
+
+        return trials, crn, seed
+
+    def validate(self, trials, crn=None, seed=None, validation_pool=None):
+        """
+        Run validation trials with the current networks, split among the workers of
+        `validation_pool` if given. Returns the performance, the total reward, and
+        the prediction error of the baseline.
+
+        """
+        if validation_pool is not None:
+            return validation_pool.run(trials, seed, crn is not None)
+
+        (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b,
+         perf, r_policy, r_value) = self.run_trials(trials, return_states=True,
+                                                    run_baseline=False,
+                                                    progress_bar=True, crn=crn)
+        if r_value is None:
+            Z_b = self.get_baseline_outputs(r_policy, A, Q_b, M)
+
+        # Value prediction error
+        V     = returns.get_returns(R, M)
+        error = np.sqrt(np.sum((Z_b - V)**2*M)/np.sum(M))
+
+        return perf, np.sum(R*M), error
+
+    def save_validation(self, savefile, history, best, validation, **state):
+        """
+        Let the task adapt to a validation, record it in the training history, and
+        save a checkpoint that includes the record.
+
+        best : dict
+               Best results so far (see `get_best`), updated if the validation is
+               the new best.
+
+        validation : tuple
+                     Iteration, total number of trials, number of trials, and the
+                     network parameters that were validated, the RNG state before the
+                     validation, and the results of `validate`.
+
+        state : The rest of the training state (see `get_save`).
+
+        Returns the items to report and whether the termination criterion is
+        satisfied.
+
+        """
+        (iter_, trials_tot, n_validation, params, baseline_params, rng_state,
+         perf, reward_sum, error) = validation
+
+        if hasattr(self.task, 'update'):
+            self.update_task(perf)
+
+        # Termination condition
+        terminate = False
+        if hasattr(self.task, 'terminate'):
+            if self.task.terminate(perf):
+                terminate = True
+
+        # Record
+        mean_reward = reward_sum/n_validation
+        record = {
+            'iter':        iter_,
+            'mean_reward': mean_reward,
+            'n_trials':    trials_tot,
+            'perf':        perf
+            }
+        if mean_reward > best['best_reward'] or terminate:
+            best['best_iter']            = iter_
+            best['best_reward']          = mean_reward
+            best['best_perf']            = perf
+            best['best_policy_params']   = params
+            best['best_baseline_params'] = baseline_params
+
+            record['new_best'] = True
+        else:
+            record['new_best'] = False
+
+        # Save, with the state written after the history record it includes
+        history.append(record)
+        save = dict(best, rng_state=rng_state, history_size=history.size)
+        save.update(state)
+        save_state(savefile, self.get_save(**save))
+
+        # Reward
+        items = OrderedDict()
+        items['Best reward'] = '{} (iteration {})'.format(best['best_reward'],
+                                                          best['best_iter'])
+        items['Mean reward'] = '{}'.format(mean_reward)
+
+        # Performance
+        if perf is not None:
+            items.update(perf.display(output=False))
+
+        # Value prediction error
+        items['Prediction error'] = '{}'.format(error)
+
+        return items, terminate
+
     def train(self, savefile, recover=False):
         """
         Train network.
@@ -560,6 +1435,15 @@ class PolicyGradient(object):
         # Parameters
         #=================================================================================
 
+        # Asynchronous training with shared parameters
+        n_hogwild = self.config.get('hogwild_workers', 0)
+        if n_hogwild > 0 and self.mode == 'continuous':
+            print("[ PolicyGradient.train ] Hogwild training is not supported in"
+                  " continuous mode.")
+            n_hogwild = 0
+        if n_hogwild > 0:
+            return HogwildTrainer(self, n_hogwild).train(savefile, recover)
+
         max_iter     = self.config['max_iter']
         lr           = self.config['lr']
         baseline_lr  = self.config['baseline_lr']
@@ -573,6 +1457,31 @@ class PolicyGradient(object):
         else:
             use_x0 = False
 
+        # Trials run by worker processes, with gradient trials pipelined with the
+        # updates
+        n_workers            = self.config.get('workers', 1)
+        n_validation_workers  = self.config.get('validation_workers', 1)
+        pipeline              = self.config.get('pipeline', False)
+        background_validation = self.config.get('background_validation', False)
+        frozen_validation     = self.config.get('frozen_validation', False)
+        if self.mode == 'continuous':
+            if (n_workers > 1 or n_validation_workers > 1 or pipeline
+                or background_validation):
+                print("[ PolicyGradient.train ] Worker processes are not supported in"
+                      " continuous mode.")
+            n_workers             = 1
+            n_validation_workers  = 1
+            pipeline              = False
+            background_validation = False
+        if pipeline:
+            staleness = self.config.get('staleness', 1)
+            importance_weights = self.config.get('importance_weights', False)
+            w_max = self.config.get('max_importance_weight', 1)
+        else:
+            staleness = 0
+            importance_weights = False
+            w_max = None
+
         # GPU?
         if theanotools.get_processor_type() == 'gpu':
             gpu = 'yes'
@@ -598,18 +1507,31 @@ class PolicyGradient(object):
         items['Max time steps']           = self.Tmax
         items['Num. trials (gradient)']   = self.config['n_gradient']
         items['Num. trials (validation)'] = self.config['n_validation']
+        if n_workers > 1:
+            items['Worker processes']     = n_workers
+        if n_validation_workers > 1:
+            items['Validation processes'] = n_validation_workers
+        if background_validation:
+            items['Background validation'] = 'yes'
+        if frozen_validation:
+            items['Frozen validation set'] = 'yes'
+        if pipeline:
+            items['Pipeline staleness']   = staleness
+            items['Importance weights']   = 'yes' if importance_weights else 'no'
         utils.print_dict(items)
 
         #=================================================================================
         # Setup
         #=================================================================================
 
+        # The first trials only need the step functions, so the update functions are
+        # compiled in the background while they're run.
+        self.compile_rollout_functions()
+
         if recover:
             print("Resume training.")
-            update_policy   = self.func_update_policy(self.Tmax, use_x0,
-                                                      accumulators=self.save['net_sgd'])
-            update_baseline = self.func_update_baseline(use_x0,
-                                                        accumulators=self.save['baseline_sgd'])
+            accumulators   = self.save['net_sgd']
+            accumulators_b = self.save['baseline_sgd']
 
             # Resume training from here
             iter_start = self.save['iter']
@@ -620,42 +1542,34 @@ class PolicyGradient(object):
             self.rng.set_state(self.save['rng_state'])
 
             # Keep track of best results
-            best_iter            = self.save['best_iter']
-            best_reward          = self.save['best_reward']
-            best_perf            = self.save['best_perf']
-            best_params          = self.save['best_policy_params']
-            best_baseline_params = self.save['best_baseline_params']
+            best = self.get_best(recover)
 
             # Initial states
             init   = self.save['init']
             init_b = self.save['init_b']
 
             # Training history
-            perf             = self.save['perf']
-            training_history = self.save['training_history']
-            trials_tot       = self.save['trials_tot']
+            perf       = self.save['perf']
+            history    = History(savefile, self.save['history_size'])
+            trials_tot = self.save['trials_tot']
         else:
-            update_policy   = self.func_update_policy(self.Tmax, use_x0)
-            update_baseline = self.func_update_baseline(use_x0)
+            accumulators   = None
+            accumulators_b = None
 
             # Start training from here
             iter_start = 0
 
             # Keep track of best results
-            best_iter   = -1
-            best_reward = -np.inf
-            best_perf   = None
-            best_params = self.policy_net.get_values()
-            best_baseline_params = self.baseline_net.get_values()
+            best = self.get_best(recover)
 
             # Initial states
             init   = None
             init_b = None
 
             # Performance history
-            perf             = None
-            training_history = []
-            trials_tot       = 0
+            perf       = None
+            history    = History(savefile)
+            trials_tot = 0
 
         #=================================================================================
         # Train
@@ -667,10 +1581,57 @@ class PolicyGradient(object):
         grad_norms_policy   = []
         grad_norms_baseline = []
 
+        update_policy   = None
+        update_baseline = None
+
+        # Gradient trials are run by worker processes
+        if n_workers > 1 or pipeline:
+            producer = RolloutProducer(self, staleness, self.rng.randint(2**31),
+                                       n_workers)
+        else:
+            producer = None
+
+        # Validation trials are split among worker processes, which can run while
+        # training continues
+        if n_validation_workers > 1 or background_validation:
+            validation_pool = ValidationPool(self, n_validation_workers)
+        else:
+            validation_pool = None
+
+        # Compiled in threads, started after the workers are forked
+        compiling_policy   = self.func_update_policy(
+            use_x0, accumulators=accumulators, background=True,
+            importance_weights=importance_weights
+            )
+        compiling_baseline = self.func_update_baseline(
+            use_x0, accumulators=accumulators_b, background=True
+            )
+
+        # Parameters being validated in the background
+        pending = None
+
+        # Throughput
+        throughput_start   = time.time()
+        throughput_trials  = 0
+        throughput_updates = 0
+
         tstart = datetime.datetime.now()
         try:
             for iter_ in xrange(iter_start, max_iter+1):
-                if iter_ % checkfreq == 0 or iter_ == max_iter:
+                is_checkpoint = (iter_ % checkfreq == 0 or iter_ == max_iter)
+
+                # Validation results to process
+                validations = []
+
+                # Collect the validation running in the background once it's done, or
+                # before starting the next one
+                if pending is not None and (is_checkpoint or validation_pool.ready()):
+                    perf_, reward_sum, error = validation_pool.result()
+                    validations.append(pending + (self.rng.get_state(), perf_,
+                                                  reward_sum, error))
+                    pending = None
+
+                if is_checkpoint:
                     if hasattr(self.task, 'n_validation'):
                         n_validation = self.task.n_validation
                     if n_validation > 0:
@@ -685,160 +1646,129 @@ class PolicyGradient(object):
                         # RNG state
                         rng_state = self.rng.get_state()
 
-                        # Trials
-                        trials = [self.task.get_condition(self.rng, self.dt)
-                                  for i in xrange(n_validation)]
+                        # Trials, the same every time for a frozen validation set
+                        trials, crn, seed = self.get_validation_trials(
+                            n_validation, frozen_validation, validation_pool
+                            )
+
+                        # Parameters being validated
+                        snapshot = (iter_, trials_tot, n_validation,
+                                    self.policy_net.get_values(),
+                                    self.baseline_net.get_values())
 
                         # Run trials
-                        (U, Q, Q_b, Z, Z_b, A, R, M, init_, init_b_, x0_, x0_b_,
-                         perf_) = self.run_trials(trials, progress_bar=True)
-                        if hasattr(self.task, 'update'):
-                            self.task.update(perf_)
-
-                        # Termination condition
-                        terminate = False
-                        if hasattr(self.task, 'terminate'):
-                            if self.task.terminate(perf_):
-                                terminate = True
-
-                        # Save
-                        mean_reward = np.sum(R*M)/n_validation
-                        record = {
-                            'iter':        iter_,
-                            'mean_reward': mean_reward,
-                            'n_trials':    trials_tot,
-                            'perf':        perf_
-                            }
-                        if mean_reward > best_reward or terminate:
-                            best_iter   = iter_
-                            best_reward = mean_reward
-                            best_perf   = perf_
-                            best_params          = self.policy_net.get_values()
-                            best_baseline_params = self.baseline_net.get_values()
-
-                            record['new_best'] = True
-                            training_history.append(record)
+                        if background_validation and iter_ < max_iter:
+                            validation_pool.submit(trials, seed, crn is not None)
+                            pending = snapshot
                         else:
-                            record['new_best'] = False
-                            training_history.append(record)
-
-                        # Save
-                        save = {
-                            'iter':                    iter_,
-                            'config':                  self.config,
-                            'policy_config':           self.policy_net.config,
-                            'baseline_config':         self.baseline_net.config,
-                            'policy_masks':            self.policy_net.get_masks(),
-                            'baseline_masks':          self.baseline_net.get_masks(),
-                            'current_policy_params':   self.policy_net.get_values(),
-                            'current_baseline_params': self.baseline_net.get_values(),
-                            'best_iter':               best_iter,
-                            'best_reward':             best_reward,
-                            'best_perf':               best_perf,
-                            'best_policy_params':      best_params,
-                            'best_baseline_params':    best_baseline_params,
-                            'rng_state':               rng_state,
-                            'init':                    init,
-                            'init_b':                  init_b,
-                            'perf':                    perf,
-                            'training_history':        training_history,
-                            'trials_tot':              trials_tot,
-                            'net_sgd':                 self.policy_sgd.get_values(),
-                            'baseline_sgd':            self.baseline_sgd.get_values()
-                            }
-                        utils.save(savefile, save)
-
-                        # Reward
-                        items = OrderedDict()
-                        items['Best reward'] = '{} (iteration {})'.format(best_reward,
-                                                                          best_iter)
-                        items['Mean reward'] = '{}'.format(mean_reward)
-
-                        # Performance
-                        if perf_ is not None:
-                            items.update(perf_.display(output=False))
-
-                        # Value prediction error
-                        V = np.zeros_like(R)
-                        for k in xrange(V.shape[0]):
-                            V[k] = np.sum(R[k:]*M[k:], axis=0)
-                        error = np.sqrt(np.sum((Z_b - V)**2*M)/np.sum(M))
-                        items['Prediction error'] = '{}'.format(error)
-
-                        # Gradient norms
-                        if len(grad_norms_policy) > 0:
-                            if DEBUG:
-                                items['|grad| (policy)']   = [len(grad_norms_policy)] + [f(grad_norms_policy)
-                                                              for f in [np.min, np.median, np.max]]
-                                items['|grad| (baseline)'] = [len(grad_norms_baseline)] + [f(grad_norms_baseline)
-                                                              for f in [np.min, np.median, np.max]]
-                            grad_norms_policy   = []
-                            grad_norms_baseline = []
-
-                        # Print
-                        utils.print_dict(items)
-
-                        # Target reward reached
-                        if best_reward >= self.config['target_reward']:
-                            print("Target reward reached.")
-                            return
-
-                        # Terminate
-                        if terminate:
-                            print("Termination criterion satisfied.")
-                            return
-                    else:
-                        '''
-                        #-----------------------------------------------------------------
-                        # Ongoing learning
-                        #-----------------------------------------------------------------
+                            validations.append(snapshot + (rng_state,) + self.validate(
+                                trials, crn, seed, validation_pool
+                                ))
+
+                #-------------------------------------------------------------------------
+                # Validation results, resolved against the iteration validated
+                #-------------------------------------------------------------------------
 
-                        if not training_history:
-                            training_history.append(perf)
-                        if training_history[0] is None:
-                            training_history[0] = perf
-
-                        # Save
-                        save = {
-                            'iter':                    iter,
-                            'config':                  self.config,
-                            'policy_config':           self.policy_net.config,
-                            'baseline_config':         self.baseline_net.config,
-                            'masks_p':                 self.policy_net.get_masks(),
-                            'masks_b':                 self.baseline_net.get_masks(),
-                            'current_policy_params':   self.policy_net.get_values(),
-                            'current_baseline_params': self.baseline_net.get_values(),
-                            'rng_state':               self.rng.get_state(),
-                            'init':                    init,
-                            'init_b':                  init_b,
-                            'perf':                    perf,
-                            'training_history':        training_history,
-                            'trials_tot':              trials_tot,
-                            'net_sgd':                 self.policy_sgd.get_values(),
-                            'baseline_sgd':            self.baseline_sgd.get_values()
-                            }
-                        utils.save(savefile, save)
-                        '''
+                for validation in validations:
+                    if validation[0] != iter_:
+                        print("Validation after {} updates (now {} updates)"
+                              .format(validation[0], iter_))
+
+                    # Record and save
+                    items, terminate = self.save_validation(
+                        savefile, history, best, validation,
+                        iter=iter_,
+                        init=init,
+                        init_b=init_b,
+                        perf=perf,
+                        trials_tot=trials_tot
+                        )
+
+                    # Throughput since the last report
+                    now = time.time()
+                    if throughput_updates > 0:
+                        elapsed = now - throughput_start
+                        items['Trials/s']  = '{:.1f}'.format(throughput_trials/elapsed)
+                        items['Updates/s'] = '{:.2f}'.format(throughput_updates/elapsed)
+                    throughput_start   = now
+                    throughput_trials  = 0
+                    throughput_updates = 0
+
+                    # Gradient norms
+                    if len(grad_norms_policy) > 0:
+                        if DEBUG:
+                            items['|grad| (policy)']   = [len(grad_norms_policy)] + [f(grad_norms_policy)
+                                                          for f in [np.min, np.median, np.max]]
+                            items['|grad| (baseline)'] = [len(grad_norms_baseline)] + [f(grad_norms_baseline)
+                                                          for f in [np.min, np.median, np.max]]
+                        grad_norms_policy   = []
+                        grad_norms_baseline = []
+
+                    # Print
+                    utils.print_dict(items)
+
+                    # Target reward reached
+                    if best['best_reward'] >= self.config['target_reward']:
+                        print("Target reward reached.")
+                        return
+
+                    # Terminate
+                    if terminate:
+                        print("Termination criterion satisfied.")
+                        return
+
+                if is_checkpoint and n_validation == 0:
+                    '''
+                    #---------------------------------------------------------------------
+                    # Ongoing learning
+                    #---------------------------------------------------------------------
+
+                    if not training_history:
+                        training_history.append(perf)
+                    if training_history[0] is None:
+                        training_history[0] = perf
+
+                    # Save
+                    save = {
+                        'iter':                    iter,
+                        'config':                  self.config,
+                        'policy_config':           self.policy_net.config,
+                        'baseline_config':         self.baseline_net.config,
+                        'masks_p':                 self.policy_net.get_masks(),
+                        'masks_b':                 self.baseline_net.get_masks(),
+                        'current_policy_params':   self.policy_net.get_values(),
+                        'current_baseline_params': self.baseline_net.get_values(),
+                        'rng_state':               self.rng.get_state(),
+                        'init':                    init,
+                        'init_b':                  init_b,
+                        'perf':                    perf,
+                        'training_history':        training_history,
+                        'trials_tot':              trials_tot,
+                        'net_sgd':                 self.policy_sgd.get_values(),
+                        'baseline_sgd':            self.baseline_sgd.get_values()
+                        }
+                    utils.save(savefile, save)
+                    '''
+                    if perf is not None:
+                        perf.display()
+
+                    # Termination condition
+                    terminate = False
+                    if hasattr(self.task, 'terminate'):
+                        if perf is not None and self.task.terminate(perf):
+                            terminate = True
+                    '''
+                    # Report
+                    if iter % 100 == 1:
+                        elapsed = utils.elapsed_time(tstart)
+                        print("After {} updates ({})".format(iter, elapsed))
                         if perf is not None:
                             perf.display()
-
-                        # Termination condition
-                        terminate = False
-                        if hasattr(self.task, 'terminate'):
-                            if perf is not None and self.task.terminate(perf):
-                                terminate = True
-                        '''
-                        # Report
-                        if iter % 100 == 1:
-                            elapsed = utils.elapsed_time(tstart)
-                            print("After {} updates ({})".format(iter, elapsed))
-                            if perf is not None:
-                                perf.display()
-                        '''
-                        # Terminate
-                        if terminate:
-                            print("Termination criterion satisfied.")
-                            return
+                    '''
+                    # Terminate
+                    if terminate:
+                        print("Termination criterion satisfied.")
+                        return
 
                 if iter_ == max_iter:
                     print("Reached maximum number of iterations ({}).".format(iter_))
@@ -848,60 +1778,62 @@ class PolicyGradient(object):
                 # Run trials
                 #-------------------------------------------------------------------------
 
-                # Trial conditions
                 if hasattr(self.task, 'n_gradient'):
                     n_gradient = self.task.n_gradient
-                trials = [self.task.get_condition(self.rng, self.dt)
-                          for i in xrange(n_gradient)]
 
-                # Run trials
-                (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b,
-                 perf, r_policy, r_value) = self.run_trials(trials,
-                                                            init=init, init_b=init_b,
-                                                            return_states=True, perf=perf)
-
-                #-------------------------------------------------------------------------
-                # Update baseline
-                #-------------------------------------------------------------------------
-
-                baseline_inputs = np.concatenate((r_policy, A), axis=-1)
+                if producer is not None:
+                    # Trials run with a policy at most `staleness` updates old
+                    lag, (U, Q, Q_b, Z, A, R, M,
+                          r_policy, record) = producer.get(iter_, n_gradient)
+                    if perf is None:
+                        perf = self.Performance()
+                    record.replay(perf)
 
-                # Compute return
-                R_b = np.zeros_like(R)
-                for k in xrange(R.shape[0]):
-                    R_b[k] = np.sum(R[k:]*M[k:], axis=0)
-
-                if use_x0:
-                    args = [x0_b]
+                    # Workers aren't used in continuous mode
+                    x0 = x0_b = None
                 else:
-                    args = []
-                args += [baseline_inputs[:-1], Q_b, R_b, M, baseline_lr]
-                b, norm_b, rmse = update_baseline(*args)
-                #print("Prediction error = {}".format(rmse))
-
-                norm_b = float(norm_b)
-                #print("norm_b = {}".format(norm_b))
-                if np.isfinite(norm_b):
-                    grad_norms_baseline.append(float(norm_b))
+                    # Trial conditions
+                    trials = [self.task.get_condition(self.rng, self.dt)
+                              for i in xrange(n_gradient)]
+
+                    # Run trials
+                    (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, x0, x0_b,
+                     perf, r_policy, r_value) = self.run_trials(
+                        trials, init=init, init_b=init_b, return_states=True,
+                        perf=perf, run_baseline=False
+                        )
+
+                # Wait for the update functions before the first update
+                if update_baseline is None:
+                    update_baseline = compiling_baseline.get()
+                    update_policy   = compiling_policy.get()
 
                 #-------------------------------------------------------------------------
-                # Update policy
+                # Update baseline and policy
                 #-------------------------------------------------------------------------
 
-                if use_x0:
-                    args = [x0]
+                if importance_weights:
+                    logmu = get_behavior_logp(Z, A, M)
                 else:
-                    args = []
-                args += [U[:-1], Q, A, R, b, M, lr]
-                norm = update_policy(*args)
-
-                norm = float(norm)
-                #print("norm = {}".format(norm))
+                    logmu = None
+                norm_b, norm = self.update_networks(update_baseline, update_policy,
+                                                    U, Q, Q_b, A, R, M, r_policy,
+                                                    x0, x0_b, lr, baseline_lr,
+                                                    logmu=logmu, w_max=w_max)
+                if np.isfinite(norm_b):
+                    grad_norms_baseline.append(norm_b)
                 if np.isfinite(norm):
                     grad_norms_policy.append(norm)
 
-                trials_tot += n_gradient
+                trials_tot         += n_gradient
+                throughput_trials  += n_gradient
+                throughput_updates += 1
 
         except KeyboardInterrupt:
             print("Training interrupted by user during iteration {}.".format(iter_))
             sys.exit(0)
+        finally:
+            if producer is not None:
+                producer.close()
+            if validation_pool is not None:
+                validation_pool.close()
@@ -46,6 +46,10 @@ class Recurrent(object):
     def get_values(self):
         return OrderedDict([(k, v.get_value()) for k, v in self.params.items()])
 
+    def set_values(self, values):
+        for k, v in values.items():
+            self.params[k].set_value(v)
+
     def get(self, name):
         p = self.params[name]
         if name in self.masks:
@@ -74,10 +78,13 @@ class Recurrent(object):
 
         return theano.function(args, [z, x0])
 
-    def func_step_t(self):
+    def func_step_t(self, batch=False):
         """
         Returns a Theano function.
 
+        If `batch` is True, the outputs keep the leading batch dimension so that
+        several trials can be advanced together.
+
         """
         Wout = self.get('Wout')
         bout = self.get('bout')
@@ -90,8 +97,67 @@ class Recurrent(object):
         r_t = self.f_hidden(x_t)
         z_t = self.f_out(r_t.dot(Wout) + bout)
 
+        if batch:
+            return theano.function([inputs, noise, x_tm1], [z_t, x_t])
         return theano.function([inputs, noise, x_tm1], [z_t[0], x_t[0]])
 
+    def get_np_values(self):
+        """
+        Current parameter values with the masks applied, as seen by the Theano graph.
+
+        """
+        values = OrderedDict()
+        for k, v in self.params.items():
+            values[k] = v.get_value()
+            if k in self.masks:
+                values[k] = values[k]*self.masks[k].get_value()
+
+        return values
+
+    def np_func_step_0(self, use_x0=False, values=None):
+        """
+        NumPy equivalent of `func_step_0`, for a snapshot of the parameters.
+
+        """
+        if values is None:
+            values = self.get_np_values()
+        Wout = values['Wout']
+        bout = values['bout']
+
+        def step_0(x0=values['x0']):
+            r = self.firing_rate(x0)
+            z = self.np_f_out(r.dot(Wout) + bout)
+
+            return [z, x0]
+
+        if use_x0:
+            return step_0
+        return (lambda: step_0())
+
+    def np_func_step_t(self, batch=False, values=None):
+        """
+        NumPy equivalent of `func_step_t`, for a snapshot of the parameters.
+
+        """
+        if values is None:
+            values = self.get_np_values()
+        Wout = values['Wout']
+        bout = values['bout']
+
+        step_params  = [self.alpha]
+        step_params += [values[k] for k in self.step_param_names]
+
+        def step_t(inputs, noise, x_tm1):
+            x_t = self.np_step(inputs, noise, x_tm1, *step_params)
+            r_t = self.firing_rate(x_t)
+            z_t = self.np_f_out(r_t.dot(Wout) + bout)
+
+            if batch:
+                return [z_t, x_t]
+            return [z_t[0], x_t[0]]
+
+        return step_t
+
     def get_outputs_0(self, x0, log=False):
         Wout = self.get('Wout')
         bout = self.get('bout')
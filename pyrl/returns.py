@@ -0,0 +1,59 @@
+"""
+Returns and advantages for batches of trials, stored as (T, n_trials) arrays of
+rewards R and masks M as in `PolicyGradient.run_trials`.
+
+"""
+from __future__ import absolute_import, division
+
+import numpy as np
+
+from . import theanotools
+
+def discount_factors(T, dt, tau_reward):
+    """
+    Discount factor exp(-t*dt/tau_reward) for each time step t = 0, ..., T-1.
+
+    """
+    if np.isfinite(tau_reward):
+        return np.exp(-np.arange(T)*(dt/tau_reward))
+    return np.ones(T)
+
+def get_returns(R, M):
+    """
+    Sum of the (already discounted) rewards from each time step to the end of the
+    trial, i.e., `np.sum(R[k:]*M[k:], axis=0)` for every k.
+
+    """
+    G = np.cumsum((R*M)[::-1], axis=0, dtype=np.float64)[::-1]
+
+    return theanotools.asarray(G)
+
+def get_advantages(R, V, M, gamma=1, lambda_=1):
+    """
+    GAE(lambda) advantages for value estimates V, computed backwards in time from
+    the TD errors
+
+      delta_t = R_t + gamma*V_{t+1} - V_t.
+
+    With gamma = lambda_ = 1 these are the returns minus V.
+
+    """
+    T = R.shape[0]
+
+    V_next = np.zeros_like(V, dtype=np.float64)
+    V_next[:-1] = V[1:]*M[1:]
+    delta = (R + gamma*V_next - V)*M
+
+    A = np.zeros_like(delta)
+    A[-1] = delta[-1]
+    for t in xrange(T-2, -1, -1):
+        A[t] = delta[t] + gamma*lambda_*A[t+1]*M[t+1]
+
+    return theanotools.asarray(A*M)
+
+def get_lambda_returns(R, V, M, gamma=1, lambda_=1):
+    """
+    TD(lambda) returns, i.e., the GAE(lambda) advantages plus V.
+
+    """
+    return theanotools.asarray((get_advantages(R, V, M, gamma, lambda_) + V)*M)
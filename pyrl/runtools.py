@@ -1,16 +1,201 @@
+"""
+Running trials for analysis, and the trial stores they are saved in.
+
+A trial store is a directory with one .npy file per array, with the trials along
+axis 1, and an index with the order of the items and the items that aren't arrays
+(the trial conditions and the performance). Loading it memory-maps the arrays, so
+an analysis only reads the trials and units it uses.
+
+"""
 from __future__ import absolute_import
 
+import hashlib
 import os
+import shutil
+
+import numpy as np
+from   numpy.lib.format import open_memmap
 
-from . import utils
+from .              import utils
+from .functioncache import update_hash
+
+INDEX = 'index.pkl'
 
 def behaviorfile(path):
-    return os.path.join(path, 'trials_behavior.pkl')
+    return os.path.join(path, 'trials_behavior')
 
 def activityfile(path):
-    return os.path.join(path, 'trials_activity.pkl')
+    return os.path.join(path, 'trials_activity')
+
+#=========================================================================================
+# Trial store
+#=========================================================================================
+
+def is_legacy(trialsfile):
+    """
+    Whether `trialsfile` is, or is to be read from, a single pickle as saved before
+    trial stores.
+
+    """
+    base, ext = os.path.splitext(trialsfile)
+    if ext == '.pkl':
+        return os.path.isfile(trialsfile) or not os.path.isdir(base)
+    return (not os.path.isfile(os.path.join(trialsfile, INDEX))
+            and os.path.isfile(trialsfile + '.pkl'))
+
+class TrialWriter(object):
+    def __init__(self, trialsfile, names, n_trials, key, seed):
+        """
+        Write a trial store a chunk of trials at a time. The index records how many
+        trials have been written, so a run that was interrupted can be resumed if it
+        has the same `key`.
+
+        key : str
+              Identifies the trials and settings of the run.
+
+        seed : int
+               Saved for a new run, so that a resumed run can use the same seed.
+
+        """
+        self.trialsfile = trialsfile
+        self.indexfile  = os.path.join(trialsfile, INDEX)
+
+        if os.path.isfile(self.indexfile):
+            index = utils.load(self.indexfile)
+            if (index.get('key') == key and index['names'] == names
+                and index['n_trials'] == n_trials):
+                self.index = index
+                return
+        if os.path.isdir(trialsfile):
+            print("Removing trials saved with different settings or parameters.")
+            shutil.rmtree(trialsfile)
+        utils.mkdir_p(trialsfile)
+
+        self.index = {
+            'names':    names,
+            'arrays':   [],
+            'objects':  {},
+            'n_trials': n_trials,
+            'n_done':   0,
+            'key':      key,
+            'seed':     seed
+            }
+
+    @property
+    def n_done(self):
+        return self.index['n_done']
+
+    def write(self, start, items):
+        """
+        Write the arrays in `items`, for the trials from `start` on, and replace the
+        other items. The index is replaced atomically after the arrays are flushed.
+
+        """
+        index = self.index
+        for name, value in items.items():
+            if isinstance(value, np.ndarray):
+                filename = os.path.join(self.trialsfile, name + '.npy')
+                if name in index['arrays']:
+                    x = np.load(filename, mmap_mode='r+')
+                else:
+                    shape = (value.shape[0], index['n_trials']) + value.shape[2:]
+                    x = open_memmap(filename, mode='w+', dtype=value.dtype,
+                                    shape=shape)
+                    index['arrays'].append(name)
+                x[:,start:start+value.shape[1]] = value
+                x.flush()
+                del x
+            else:
+                index['objects'][name] = items[name]
+
+        n = [v.shape[1] for v in items.values() if isinstance(v, np.ndarray)]
+        if len(n) > 0:
+            index['n_done'] = max(index['n_done'], start + n[0])
+
+        tmpname = self.indexfile + '.tmp'
+        utils.save(tmpname, index)
+        os.rename(tmpname, self.indexfile)
+
+def load(trialsfile):
+    """
+    The items saved in `trialsfile`, in order, with the arrays memory-mapped
+    copy-on-write. Also reads the pickle saved before trial stores, given either
+    path.
+
+    """
+    base, ext = os.path.splitext(trialsfile)
+    if is_legacy(trialsfile):
+        if ext != '.pkl':
+            trialsfile += '.pkl'
+        return utils.load(trialsfile)
+    if ext == '.pkl':
+        trialsfile = base
+
+    index = utils.load(os.path.join(trialsfile, INDEX))
+    if index['n_done'] < index['n_trials']:
+        raise IOError("{} has {}/{} trials. Run the trials again to finish it."
+                      .format(trialsfile, index['n_done'], index['n_trials']))
+
+    values = []
+    for name in index['names']:
+        if name in index['arrays']:
+            values.append(np.load(os.path.join(trialsfile, name + '.npy'),
+                                  mmap_mode='c'))
+        else:
+            values.append(index['objects'][name])
+
+    return values
 
-def run(action, trials, pg, scratchpath, dt_save=None):
+def get_size(trialsfile):
+    """
+    Size on disk in bytes.
+
+    """
+    if os.path.isfile(trialsfile):
+        return os.path.getsize(trialsfile)
+
+    return sum([os.path.getsize(os.path.join(trialsfile, filename))
+                for filename in os.listdir(trialsfile)])
+
+#=========================================================================================
+# Run trials
+#=========================================================================================
+
+def subsample_time(trials, inc, subsampled=None):
+    """
+    Subsample each trial's time points, keeping trials that shared a time array
+    sharing the subsampled one, including across calls with the same `subsampled`.
+
+    """
+    if subsampled is None:
+        subsampled = {}
+    for trial in trials:
+        time = trial['time']
+        if id(time) not in subsampled:
+            subsampled[id(time)] = time, time[::inc]
+        trial['time'] = subsampled[id(time)][1]
+
+def get_key(action, trials, inc, chunk_size, pg):
+    """
+    Identifies a run by its trials and settings, and by the networks that run them,
+    so that trials saved before retraining aren't reused.
+
+    """
+    h = hashlib.sha1()
+    update_hash(h, [action, inc, chunk_size, trials, pg.dt])
+    for net in [pg.policy_net, pg.baseline_net]:
+        update_hash(h, [type(net).__name__, net.config, net.get_values()])
+
+    return h.hexdigest()
+
+def run(action, trials, pg, scratchpath, dt_save=None, chunk_size=1000):
+    """
+    Run `trials` in chunks of `chunk_size` and save them in a trial store as each
+    chunk finishes, so that memory doesn't grow with the number of trials. Each chunk
+    uses a random number generator seeded from its position, so a run that was
+    interrupted is resumed from the last saved chunk with the same results.
+
+    """
     if dt_save is not None:
         dt  = pg.dt
         inc = int(dt_save/dt)
@@ -18,39 +203,66 @@ def run(action, trials, pg, scratchpath, dt_save=None):
         inc = 1
     print("Saving in increments of {}".format(inc))
 
-    # Run trials
     if action == 'trials-b':
         print("Saving behavior only.")
         trialsfile = behaviorfile(scratchpath)
-
-        (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, states_0, states_0_b,
-         perf) = pg.run_trials(trials, progress_bar=True)
-
-        for trial in trials:
-            trial['time'] = trial['time'][::inc]
-        save = [trials, A[::inc], R[::inc], M[::inc], perf]
+        names      = ['trials', 'A', 'R', 'M', 'perf']
     elif action == 'trials-a':
         print("Saving behavior + activity.")
         trialsfile = activityfile(scratchpath)
-
-        (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, states_0, states_0_b,
-         perf, states, states_b) = pg.run_trials(trials,
-                                                 return_states=True,
-                                                 progress_bar=True)
-
-        for trial in trials:
-            trial['time'] = trial['time'][::inc]
-        save = [trials, U[::inc], Z[::inc], Z_b[::inc], A[::inc], R[::inc],
-                M[::inc], perf, states[::inc], states_b[::inc]]
+        names      = ['trials', 'U', 'Z', 'Z_b', 'A', 'R', 'M', 'perf', 'states',
+                      'states_b']
     else:
         raise ValueError(action)
 
-    # Performance
-    perf.display()
+    n_trials = len(trials)
+    writer   = TrialWriter(trialsfile, names, n_trials,
+                           get_key(action, trials, inc, chunk_size, pg),
+                           pg.rng.randint(2**31))
+    perf     = writer.index['objects'].get('perf')
+    if writer.n_done == n_trials:
+        print("All {} trials were saved before.".format(n_trials))
+    elif writer.n_done > 0:
+        print("Resuming after {}/{} trials.".format(writer.n_done, n_trials))
+
+    # Trials that were already run
+    subsampled = {}
+    subsample_time(trials[:writer.n_done], inc, subsampled)
+
+    rng = pg.rng
+    try:
+        for start in xrange(writer.n_done, n_trials, chunk_size):
+            chunk = trials[start:start+chunk_size]
+            print("Trials {}-{} of {}".format(start+1, start+len(chunk), n_trials))
 
-    # Save
-    utils.save(trialsfile, save)
+            pg.rng = np.random.RandomState([writer.index['seed'], start//chunk_size])
+            if action == 'trials-b':
+                (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, states_0, states_0_b,
+                 perf) = pg.run_trials(chunk, perf=perf, progress_bar=True)
+
+                items = {'A': A[::inc], 'R': R[::inc], 'M': M[::inc]}
+            else:
+                (U, Q, Q_b, Z, Z_b, A, R, M, init, init_b, states_0, states_0_b,
+                 perf, states, states_b) = pg.run_trials(chunk, perf=perf,
+                                                         return_states=True,
+                                                         progress_bar=True)
+
+                items = {'U': U[::inc], 'Z': Z[::inc], 'Z_b': Z_b[::inc],
+                         'A': A[::inc], 'R': R[::inc], 'M': M[::inc],
+                         'states': states[::inc], 'states_b': states_b[::inc]}
+            items['perf'] = perf
+
+            subsample_time(chunk, inc, subsampled)
+            if start + len(chunk) == n_trials:
+                items['trials'] = trials
+            writer.write(start, items)
+    finally:
+        pg.rng = rng
+
+    # Performance
+    if perf is not None:
+        perf.display()
 
     # File size
-    size_in_bytes = os.path.getsize(trialsfile)
+    size_in_bytes = get_size(trialsfile)
     print("File size: {:.1f} MB".format(size_in_bytes/2**20))
@@ -57,14 +57,17 @@ class Simple(Recurrent):
         # Hidden
         self.f_hidden        = tensor.nnet.relu
         self.states_to_rates = nptools.relu
+        self.firing_rate     = nptools.relu
 
         # Output
         if self.config['f_out'] == 'softmax':
-            self.f_out  = theanotools.softmax
-            self.f_out3 = theanotools.softmax3
+            self.f_out    = theanotools.softmax
+            self.f_out3   = theanotools.softmax3
+            self.np_f_out = nptools.softmax
         elif self.config['f_out'] == 'linear':
-            self.f_out  = (lambda x: x)
-            self.f_out3 = self.f_out
+            self.f_out    = (lambda x: x)
+            self.f_out3   = self.f_out
+            self.np_f_out = self.f_out
         else:
             raise NotImplementedError("[ Simple ] Unknown output activation {}."
                                       .format(self.config['f_out']))
@@ -148,10 +151,25 @@ class Simple(Recurrent):
 
             return next_states
 
-        self.step         = step
-        self.step_params  = [self.alpha]
-        self.step_params += [self.params[k]
-                             for k in ['Win', 'bin', 'Wrec']]
+        self.step             = step
+        self.step_param_names = ['Win', 'bin', 'Wrec']
+        self.step_params      = [self.alpha]
+        self.step_params     += [self.params[k] for k in self.step_param_names]
+
+    def np_step(self, inputs, noise, states, alpha, Win, bin, Wrec):
+        """
+        NumPy version of `step`.
+
+        """
+        inputs_t     = inputs.dot(Win) + bin
+        state_inputs = inputs_t
+
+        r = self.states_to_rates(states)
+
+        next_states = r.dot(Wrec) + state_inputs + noise
+        next_states = (1 - alpha)*states + alpha*next_states
+
+        return next_states
 
     def get_regs(self, states_0_, states, M):
         """
@@ -59,10 +59,150 @@ def to_map(*args):
 def get_idx(t, (start, end)):
     return list(np.where((start <= t) & (t < end))[0])
 
+class Epochs(dict):
+    """
+    Maps each epoch name to the list of time indices in the epoch, and additionally
+    keeps lookup tables so that membership tests take constant time:
+
+      names : Epoch names, ordered by start time.
+      table : Index into `names` of the epoch at each time index, or -1. Where
+              epochs overlap, the one that starts later is stored.
+      masks : Epoch name -> boolean array, True at the time indices in the epoch.
+
+    The tables have one more entry than the time array, which is never in an epoch,
+    because the last task step looks one time index ahead.
+
+    """
+    def __init__(self, t, durations):
+        super(Epochs, self).__init__()
+
+        self.names = sorted([k for k in durations if k != 'tmax'],
+                            key=lambda k: durations[k])
+        self.table = -np.ones(len(t)+1, dtype=int)
+        self.masks = {}
+        for i, k in enumerate(self.names):
+            self[k] = get_idx(t, durations[k])
+
+            mask = np.zeros(len(t)+1, dtype=bool)
+            mask[self[k]] = True
+            self.masks[k] = mask
+
+            self.table[mask] = i
+
+    def contains(self, name, t):
+        """
+        Same as `t in self[name]`, but in constant time.
+
+        """
+        mask = self.masks.get(name)
+        if mask is None or not 0 <= t < len(mask):
+            return False
+        return mask[t]
+
+# Cache of (time, Epochs) for recently seen epoch durations
+_epochs_cache      = OrderedDict()
+_epochs_cache_size = 1024
+
+def _epochs_key(dt, epochs):
+    return (dt,) + tuple(sorted((k, v if k == 'tmax' else tuple(v))
+                                for k, v in epochs.items()))
+
 def get_epochs_idx(dt, epochs):
-    t = np.linspace(0, epochs['tmax'], int(epochs['tmax']/dt)+1)
+    """
+    Time points and epoch indices for the given epoch durations.
+
+    Results are cached for the most recent distinct durations, so the returned
+    arrays are shared between trials and must not be modified.
+
+    """
+    key = _epochs_key(dt, epochs)
+    try:
+        t, e = _epochs_cache.pop(key)
+    except KeyError:
+        t = np.linspace(0, epochs['tmax'], int(epochs['tmax']/dt)+1)
+        e = Epochs(t, epochs)
 
-    return t, {k: get_idx(t, v) for k, v in epochs.items() if k != 'tmax'}
+        for a in [t, e.table] + e.masks.values():
+            a.flags.writeable = False
+
+        if len(_epochs_cache) >= _epochs_cache_size:
+            _epochs_cache.popitem(last=False)
+    _epochs_cache[key] = t, e
+
+    return t, e
+
+#=========================================================================================
+# Functions for stepping a batch of trials
+#=========================================================================================
+
+def in_epoch(trials, name, t):
+    """
+    Boolean array, True for trials that are in epoch `name` at time index `t`, i.e.,
+    the batch version of `t in trial['epochs'][name]`.
+
+    If `t` is an array of time indices the result has shape (len(t), n_trials).
+
+    """
+    if np.isscalar(t):
+        return np.array([trial['epochs'].contains(name, t) for trial in trials],
+                        dtype=bool)
+
+    t    = np.asarray(t)
+    mask = np.zeros((len(t), len(trials)), dtype=bool)
+    for i, trial in enumerate(trials):
+        epoch_mask = trial['epochs'].masks.get(name)
+        if epoch_mask is not None:
+            valid = (0 <= t) & (t < len(epoch_mask))
+            mask[valid,i] = epoch_mask[t[valid]]
+
+    return mask
+
+def get_values(trials, name):
+    return np.array([trial[name] for trial in trials])
+
+def new_status(n_trials, keys=['choice', 't_choice', 'correct']):
+    """
+    Status for a batch of trials. Entries that are None are treated as missing.
+
+    """
+    status = {'continue': np.ones(n_trials, dtype=bool)}
+    for k in keys:
+        status[k] = np.empty(n_trials, dtype=object)
+
+    return status
+
+def get_status(status, i):
+    """
+    Status dict of the `i`th trial in a batch.
+
+    """
+    status_i = {k: v[i] for k, v in status.items() if v[i] is not None}
+    status_i['continue'] = bool(status['continue'][i])
+
+    return status_i
+
+def get_steps(get_step, rng, dt, trials, t, actions):
+    """
+    Batch version of a scalar `get_step`, for tasks that don't define `get_steps`.
+
+    """
+    n_trials = len(trials)
+
+    U        = []
+    rewards  = np.zeros(n_trials)
+    statuses = []
+    for i, (trial, a) in enumerate(zip(trials, actions)):
+        u, rewards[i], status = get_step(rng, dt, trial, t, a)
+        U.append(u)
+        statuses.append(status)
+
+    keys   = set([k for status_i in statuses for k in status_i if k != 'continue'])
+    status = new_status(n_trials, keys)
+    for i, status_i in enumerate(statuses):
+        for k, v in status_i.items():
+            status[k][i] = v
+
+    return np.array(U), rewards, status
 
 #=========================================================================================
 # Functions for defining datasets
@@ -1,3 +1,6 @@
+import sys
+import threading
+
 import numpy as np
 
 import theano
@@ -95,6 +98,29 @@ def choice(rng, a, size=1, replace=True, p=None):
     #else:
     #    return a.take(idx)
 
+def choice_batch(rng, P, u=None, validate=False):
+    """
+    Draw one sample from each row of the (B, n) probability matrix `P`.
+
+    With the same `rng` state this gives the same samples as calling
+    `choice(rng, n, p=P[i])` for i = 0, ..., B-1, since both use one uniform per
+    sample. The uniforms can also be given as `u`.
+
+    """
+    P = np.array(P, ndmin=2, copy=False)
+    if validate:
+        if np.any(P < 0):
+            raise ValueError("probabilities are not non-negative")
+        if not np.allclose(P.sum(axis=1), 1):
+            raise ValueError("probabilities do not sum to 1")
+
+    cdf  = P.cumsum(axis=1)
+    cdf /= cdf[:,-1:]
+    if u is None:
+        u = rng.rand(len(P))
+
+    return np.sum(cdf <= np.reshape(u, (-1, 1)), axis=1)
+
 #=========================================================================================
 # Output activations
 #=========================================================================================
@@ -141,18 +167,47 @@ def normalization3(x):
 
 def get_processor_type():
     """
-    Test whether the GPU is being used, based on the example in
-
-      http://deeplearning.net/software/theano/tutorial/using_gpu.html
+    Whether Theano is set up to use the GPU, from the configured device. Unlike
+    compiling a test function, this doesn't trigger any compilation.
 
     """
-    rng = np.random.RandomState(1234)
+    if theano.config.device.startswith(('gpu', 'cuda', 'opencl')):
+        return 'gpu'
+    return 'cpu'
+
+#=========================================================================================
+# Compilation
+#=========================================================================================
+
+# Theano's optimizer and module cache aren't thread-safe, so compilations in different
+# threads of the same process are serialized.
+compile_lock = threading.RLock()
 
-    n = 10*30*768
-    x = shared(rng.rand(n))
-    f = theano.function([], tensor.exp(x))
+class BackgroundCompile(object):
+    """
+    Run `build()` in a daemon thread. `get()` waits for the result and reraises any
+    exception raised in the thread.
 
-    if np.any([isinstance(x.op, tensor.Elemwise) and ('Gpu' not in type(x.op).__name__)
-               for x in f.maker.fgraph.toposort()]):
-        return 'cpu'
-    return 'gpu'
+    """
+    def __init__(self, build):
+        self.result = None
+        self.error  = None
+
+        self.thread = threading.Thread(target=self.run, args=(build,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, build):
+        try:
+            self.result = build()
+        except BaseException:
+            self.error = sys.exc_info()
+
+    def get(self):
+        # Join with a timeout so that the main thread can still be interrupted
+        while self.thread.is_alive():
+            self.thread.join(0.1)
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+
+        return self.result
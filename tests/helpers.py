@@ -0,0 +1,36 @@
+from __future__ import absolute_import
+
+import os
+
+import numpy as np
+
+from pyrl       import theanotools
+from pyrl.model import Model
+
+modelspath = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                          'examples', 'models')
+
+def make_pg(name='rdm_fixed', seed=1, **config):
+    """
+    A small network for the task `name`, with random output weights so that the
+    policy isn't uniform.
+
+    """
+    model = Model(os.path.join(modelspath, name + '.py'))
+    model.config.update(N=20, baseline_N=20, cache_functions=False)
+    model.config.update(config)
+    pg = model.get_pg(model.config, seed, backend=config.get('backend'))
+
+    rng = np.random.RandomState(0)
+    for net in [pg.policy_net, pg.baseline_net]:
+        W = net.params['Wout']
+        W.set_value(theanotools.asarray(rng.normal(size=W.get_value().shape)))
+    if pg.backend == 'numpy':
+        pg.set_np_step_functions()
+
+    return pg
+
+def get_trials(pg, n_trials, seed=1):
+    rng = np.random.RandomState(seed)
+
+    return [pg.task.get_condition(rng, pg.dt) for i in xrange(n_trials)]
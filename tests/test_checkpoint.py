@@ -0,0 +1,115 @@
+from __future__ import absolute_import
+
+from   collections import OrderedDict
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyrl import checkpoint, utils
+
+def get_state(iter_):
+    rng = np.random.RandomState(iter_)
+
+    return {
+        'iter':        iter_,
+        'best_reward': -1.5,
+        'config':      {'N': 20, 'actions': ['FIXATE', 'LEFT']},
+        'init':        rng.normal(size=(3, 4)),
+        'params':      OrderedDict([('Win', rng.normal(size=(2, 3))),
+                                    ('bout', rng.normal(size=2))]),
+        'perf':        [1, 2, 3]
+        }
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp  = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'model.ckpt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assertStateEqual(self, save, state):
+        self.assertEqual(save['iter'], state['iter'])
+        self.assertEqual(save['best_reward'], state['best_reward'])
+        self.assertEqual(save['config'], state['config'])
+        self.assertEqual(save['perf'], state['perf'])
+        self.assertTrue(np.array_equal(save['init'], state['init']))
+        self.assertEqual(list(save['params']), list(state['params']))
+        for name in state['params']:
+            self.assertTrue(np.array_equal(save['params'][name],
+                                           state['params'][name]))
+
+    def test_save_load(self):
+        for iter_ in xrange(4):
+            checkpoint.save_state(self.path, get_state(iter_))
+            self.assertStateEqual(checkpoint.load(self.path), get_state(iter_))
+
+        # Only the current and the previous generation are kept
+        self.assertEqual(sorted([name for name in os.listdir(self.path)
+                                 if name.startswith('state-')]),
+                         ['state-2', 'state-3'])
+
+    def test_copy_on_write(self):
+        checkpoint.save_state(self.path, get_state(0))
+
+        save = checkpoint.load(self.path)
+        save['init'][:] = 0
+        self.assertStateEqual(checkpoint.load(self.path), get_state(0))
+
+    def test_resume_history(self):
+        """
+        Records appended after the last saved state are dropped on resume.
+
+        """
+        history = checkpoint.History(self.path)
+        for iter_ in xrange(3):
+            history.append({'iter': iter_})
+            state = get_state(iter_)
+            state['history_size'] = history.size
+            checkpoint.save_state(self.path, state)
+
+        # Interrupted between the record and the state
+        history.append({'iter': 3})
+        history.close()
+
+        save = checkpoint.load(self.path)
+        self.assertEqual(save['training_history'], [{'iter': i} for i in xrange(3)])
+        self.assertEqual(len(checkpoint.load_history(self.path)), 4)
+
+        history = checkpoint.History(self.path, save['history_size'])
+        history.append({'iter': 4})
+        history.close()
+        self.assertEqual([record['iter']
+                          for record in checkpoint.load_history(self.path)],
+                         [0, 1, 2, 4])
+
+    def test_legacy(self):
+        """
+        Legacy savefiles are read as they are, and only converted by `upgrade`.
+
+        """
+        state = get_state(5)
+        state['training_history'] = [{'iter': 0}, {'iter': 5}]
+        filename = os.path.join(self.tmp, 'model.pkl')
+        utils.save(filename, state)
+
+        self.assertEqual(checkpoint.find(self.tmp, 'model'), filename)
+        self.assertStateEqual(checkpoint.load(filename), state)
+        self.assertEqual(checkpoint.load_history(filename), state['training_history'])
+        self.assertFalse(os.path.exists(self.path))
+
+        self.assertEqual(checkpoint.upgrade(filename), self.path)
+        self.assertEqual(checkpoint.find(self.tmp, 'model'), self.path)
+
+        save = checkpoint.load(self.path)
+        self.assertStateEqual(save, state)
+        self.assertEqual(save['training_history'], state['training_history'])
+
+        # The conversion is read from then on
+        self.assertTrue(isinstance(checkpoint.load(filename), checkpoint.Savefile))
+
+if __name__ == '__main__':
+    unittest.main()
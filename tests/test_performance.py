@@ -0,0 +1,113 @@
+from __future__ import absolute_import
+
+import cPickle as pickle
+import unittest
+
+import numpy as np
+
+from pyrl.performance import Performance2AFC, PerformancePostdecisionWager
+
+def random_2AFC(rng, n_trials):
+    perf = Performance2AFC()
+    for i in xrange(n_trials):
+        if rng.rand() < 0.8:
+            choice = ['L', 'R'][rng.randint(2)]
+            perf.update({}, {'choice': choice, 'correct': bool(rng.randint(2)),
+                             't_choice': rng.randint(1000)})
+        else:
+            perf.update({}, {})
+
+    return perf
+
+def random_wager(rng, n_trials):
+    perf = PerformancePostdecisionWager()
+    for i in xrange(n_trials):
+        status = {}
+        r = rng.rand()
+        if r < 0.6:
+            status = {'choice': ['L', 'R'][rng.randint(2)],
+                      'correct': bool(rng.randint(2)), 't_choice': rng.randint(1000)}
+        elif r < 0.8:
+            status = {'choice': 'S', 't_choice': rng.randint(1000)}
+        perf.update({'wager': bool(rng.randint(2))}, status)
+
+    return perf
+
+def get_values(perf, names):
+    return [list(getattr(perf, name)) for name in names]
+
+class TestPerformance(unittest.TestCase):
+    cases = [
+        (random_2AFC, ['decisions', 'corrects', 'choices', 't_choices'],
+         ['n_decision', 'n_correct']),
+        (random_wager, ['wagers', 'corrects', 'choices', 't_choices'],
+         ['n_wager', 'n_correct', 'n_answer', 'n_decision', 'n_sure',
+          'n_sure_decision'])
+        ]
+
+    def test_merge(self):
+        """
+        Merging gives the same values and counts as adding all the trials to one.
+
+        """
+        for make, names, counters in self.cases:
+            whole = make(np.random.RandomState(0), 300)
+
+            rng   = np.random.RandomState(0)
+            parts = [make(rng, n) for n in [100, 0, 150, 50]]
+            merged = parts[0]
+            for part in parts[1:]:
+                merged.merge(part)
+
+            self.assertEqual(merged.n_trials, whole.n_trials)
+            self.assertEqual(get_values(merged, names), get_values(whole, names))
+            for name in counters:
+                self.assertEqual(getattr(merged, name), getattr(whole, name))
+
+    def test_merge_labels(self):
+        """
+        Choices are merged by label, whatever order the labels were first seen in.
+
+        """
+        a = Performance2AFC()
+        a.update({}, {'choice': 'R', 'correct': True, 't_choice': 1})
+        b = Performance2AFC()
+        b.update({}, {'choice': 'L', 'correct': False, 't_choice': 2})
+        b.update({}, {})
+        b.update({}, {'choice': 'R', 'correct': True, 't_choice': 3})
+
+        a.merge(b)
+        self.assertEqual(list(a.choices), ['R', 'L', None, 'R'])
+        self.assertEqual(list(a.t_choices), [1, 2, None, 3])
+
+    def test_pickle(self):
+        for make, names, counters in self.cases:
+            perf = make(np.random.RandomState(1), 200)
+            copy = pickle.loads(pickle.dumps(perf, pickle.HIGHEST_PROTOCOL))
+
+            self.assertEqual(get_values(copy, names), get_values(perf, names))
+            for name in counters:
+                self.assertEqual(getattr(copy, name), getattr(perf, name))
+
+            # Still grows after loading
+            copy.merge(perf)
+            self.assertEqual(copy.n_trials, 2*perf.n_trials)
+
+    def test_legacy_state(self):
+        """
+        Performance pickled when the values were kept in lists.
+
+        """
+        perf = Performance2AFC()
+        perf.__setstate__({'decisions': [True, False, True],
+                           'corrects':  [True, False, False],
+                           'choices':   ['L', None, 'R'],
+                           't_choices': [5, None, 7]})
+
+        self.assertEqual(perf.n_trials, 3)
+        self.assertEqual((perf.n_decision, perf.n_correct), (2, 1))
+        self.assertEqual(list(perf.choices), ['L', None, 'R'])
+        self.assertEqual(list(perf.t_choices), [5, None, 7])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+from __future__ import absolute_import
+
+import unittest
+
+import numpy as np
+
+from pyrl import theanotools
+
+from helpers import get_trials, make_pg
+
+class TestRollout(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pg     = make_pg(backend='numpy')
+        cls.trials = get_trials(cls.pg, 40)
+
+    def run_trials(self, rollout, crn=7, **kwargs):
+        pg = self.pg
+
+        rollout_, pg.rollout = pg.rollout, rollout
+        pg.rng = np.random.RandomState(3)
+        try:
+            return pg.run_trials(list(self.trials), crn=crn, **kwargs)
+        finally:
+            pg.rollout = rollout_
+
+    def test_serial_batched(self):
+        """
+        With common random numbers, serial and batched rollouts run the same trials.
+
+        """
+        serial  = self.run_trials('serial',  return_states=True)
+        batched = self.run_trials('batched', return_states=True)
+
+        # U, Q, Q_b, Z, Z_b, A, R, M
+        for x, y in zip(serial[:8], batched[:8]):
+            self.assertEqual(x.shape, y.shape)
+            self.assertTrue(np.allclose(x, y, atol=1e-6))
+
+        # Firing rates
+        self.assertTrue(np.allclose(serial[-2], batched[-2], atol=1e-6))
+
+        # Performance
+        self.assertEqual(serial[12].__getstate__(), batched[12].__getstate__())
+
+    def test_crn_inputs(self):
+        """
+        A trial's inputs with common random numbers don't depend on the policy.
+
+        """
+        pg = self.pg
+
+        U, M = [], []
+        values = pg.policy_net.get_values()
+        try:
+            for scale in [1, 3]:
+                pg.policy_net.params['Wout'].set_value(scale*values['Wout'])
+                rvals = self.run_trials('serial')
+                U.append(rvals[0])
+                M.append(rvals[7])
+        finally:
+            pg.policy_net.set_values(values)
+        pg.set_np_step_functions()
+
+        # The trials last different times with the two policies
+        self.assertTrue(np.any(M[0] != M[1]))
+
+        both = (M[0] > 0) & (M[1] > 0)
+        self.assertTrue(np.array_equal(U[0][both], U[1][both]))
+
+class TestBackend(unittest.TestCase):
+    def test_step_functions(self):
+        """
+        The NumPy step functions give the same outputs as the compiled ones.
+
+        """
+        pg_theano = make_pg(backend='theano')
+        pg_numpy  = make_pg(backend='numpy')
+
+        z_theano, x_theano = pg_theano.policy_step_0()
+        z_numpy,  x_numpy  = pg_numpy.policy_step_0()
+        self.assertTrue(np.allclose(z_theano, z_numpy, atol=1e-5))
+        self.assertTrue(np.allclose(x_theano, x_numpy, atol=1e-5))
+
+        rng = np.random.RandomState(0)
+        u = theanotools.asarray(rng.normal(size=(5, pg_numpy.Nin)))
+        q = theanotools.asarray(rng.normal(size=(5, pg_numpy.policy_net.noise_dim)))
+        x = theanotools.asarray(rng.normal(size=(5, pg_numpy.policy_net.N)))
+        for y_theano, y_numpy in zip(pg_theano.step_t_policy(u, q, x),
+                                     pg_numpy.step_t_policy(u, q, x)):
+            self.assertTrue(np.allclose(y_theano, y_numpy, atol=1e-5))
+
+class TestChoice(unittest.TestCase):
+    def test_choice_batch(self):
+        """
+        `choice_batch` draws the same samples as `choice` row by row.
+
+        """
+        P = np.random.RandomState(0).dirichlet(np.ones(3), size=100)
+
+        rng = np.random.RandomState(1)
+        a   = [theanotools.choice(rng, 3, p=p) for p in P]
+
+        rng = np.random.RandomState(1)
+        self.assertEqual(list(theanotools.choice_batch(rng, P)), a)
+
+    def test_uniforms(self):
+        P = np.array([[0.2, 0.3, 0.5]]*4)
+        u = np.array([0.1, 0.3, 0.6, 0.99])
+        self.assertEqual(list(theanotools.choice_batch(None, P, u)), [0, 1, 2, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pyrl import runtools
+
+from helpers import get_trials, make_pg
+
+class Interrupt(Exception):
+    pass
+
+class TestTrialStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pg     = make_pg(backend='numpy')
+        cls.trials = get_trials(cls.pg, 25)
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_trials(self, path, action='trials-a', n_chunks=None):
+        """
+        Run the trials in chunks of 10, stopping after `n_chunks` chunks if given.
+
+        """
+        pg = self.pg
+        pg.rng = np.random.RandomState(5)
+
+        run_trials = pg.run_trials
+        def run_chunk(*args, **kwargs):
+            if self.n_chunks == n_chunks:
+                raise Interrupt()
+            self.n_chunks += 1
+            return run_trials(*args, **kwargs)
+
+        self.n_chunks  = 0
+        pg.run_trials  = run_chunk
+        try:
+            runtools.run(action, list(self.trials), pg, path, chunk_size=10)
+        except Interrupt:
+            pass
+        finally:
+            del pg.run_trials
+
+        return self.n_chunks
+
+    def assertStoresEqual(self, x, y):
+        self.assertEqual(len(x), len(y))
+        for a, b in zip(x, y):
+            if isinstance(a, np.ndarray):
+                self.assertTrue(np.array_equal(a, b))
+        self.assertEqual(x[-3].__getstate__(), y[-3].__getstate__())
+
+    def test_resume(self):
+        """
+        An interrupted run resumes after the last saved chunk with the same results.
+
+        """
+        path_a = os.path.join(self.tmp, 'a')
+        path_b = os.path.join(self.tmp, 'b')
+
+        self.assertEqual(self.run_trials(path_a), 3)
+        store = runtools.load(runtools.activityfile(path_a))
+        self.assertEqual(store[1].shape[1], len(self.trials))
+
+        self.run_trials(path_b, n_chunks=2)
+        self.assertRaises(IOError, runtools.load, runtools.activityfile(path_b))
+
+        self.assertEqual(self.run_trials(path_b), 1)
+        self.assertStoresEqual(runtools.load(runtools.activityfile(path_b)), store)
+
+        # Nothing left to run
+        self.assertEqual(self.run_trials(path_b), 0)
+
+    def test_key(self):
+        """
+        Trials saved with other network parameters are run again.
+
+        """
+        pg = self.pg
+
+        self.run_trials(self.tmp, 'trials-b')
+        A = np.array(runtools.load(runtools.behaviorfile(self.tmp))[1])
+
+        values = pg.policy_net.get_values()
+        try:
+            pg.policy_net.params['Wout'].set_value(2*values['Wout'])
+            self.assertEqual(self.run_trials(self.tmp, 'trials-b'), 3)
+            A_new = runtools.load(runtools.behaviorfile(self.tmp))[1]
+        finally:
+            pg.policy_net.set_values(values)
+
+        self.assertFalse(np.array_equal(A, A_new))
+
+if __name__ == '__main__':
+    unittest.main()